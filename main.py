@@ -8,7 +8,8 @@
 #  • HTTP server (asyncio) serving both static files and JSON APIs
 #  • Wi-Fi manager: falls back to AP mode if STA credentials fail
 #  • Real-time LED status indicators
-#  • File-manager, chat, system-info and configuration APIs
+#  • File-manager, chat, system-info and configuration APIs,
+#    imported from pwd_*.py feature modules on first use
 #
 #  Configuration is **completely** driven by config.json;
 #  no hard-coded values are used except safe fall-backs.
@@ -16,22 +17,48 @@
 import gc
 import json
 import os
-import socket
-import select
+import sys
 import machine
 import network
 import time
-from machine import Pin, ADC
+from machine import Pin
 import uasyncio as asyncio
+try:
+    import deflate              # MicroPython ≥ 1.21; only needed for gzip-only files
+except ImportError:
+    deflate = None
 
 PICOWDESK_VERSION = "1.0.0"  #PicoWDesk Release Version
+BOOT_PROFILE = [("imports", time.ticks_ms(), gc.mem_free())]   # (stage, ms since reset, free heap)
 
 # ----------------------------------------------------------
 # 1.  LOGGING
+#     Lines go to a RAM ring (read at /api/log); only those at
+#     LOG_SERIAL_LEVEL or above are also printed over USB serial.
 # ----------------------------------------------------------
-def log(msg: str) -> None:
-    """Prefix all console output with [PicoWDesk] for clarity."""
-    print("[PicoWDesk]", msg)
+LOG_LEVELS = {"debug": 10, "info": 20, "warn": 30, "error": 40}
+LOG_RING   = [None] * 64        # "<ticks_ms> <LEVEL> <msg>", slot = seq % len (resized from config)
+LOG_SEQ    = 0                  # number of the newest line
+LOG_LEVEL  = 20                 # lowest level kept in the ring
+LOG_SERIAL = 20                 # lowest level printed to the console
+
+
+def log(msg: str, level: str = "info") -> None:
+    """Record one log line; console output is prefixed with [PicoWDesk]."""
+    global LOG_SEQ
+    lv = LOG_LEVELS[level]
+    if lv >= LOG_LEVEL:
+        LOG_SEQ += 1
+        LOG_RING[LOG_SEQ % len(LOG_RING)] = f"{time.ticks_ms()} {level.upper()} {msg}"
+    if lv >= LOG_SERIAL:
+        print("[PicoWDesk]", msg)
+
+
+def boot_mark(stage: str) -> None:
+    """Boot profiler: record time since reset and free heap after *stage* (/api/boot)."""
+    gc.collect()
+    BOOT_PROFILE.append((stage, time.ticks_ms(), gc.mem_free()))
+    log(f"Boot: {stage} at {BOOT_PROFILE[-1][1]} ms, {BOOT_PROFILE[-1][2]} B free")
 
 
 # ----------------------------------------------------------
@@ -40,7 +67,7 @@ def log(msg: str) -> None:
 try:
     with open('config.json') as f:
         CFG = json.load(f)
-except OSError:
+except (OSError, ValueError):   # missing, or cut short by a reset: boot on defaults
     CFG = {}
 
 # Provide safe fall-backs and document each key
@@ -53,14 +80,68 @@ CFG.setdefault("AP_PASS", "picowdesk12345")    # Password for AP mode (start_ap)
 CFG.setdefault("PORT", 80)                     # TCP port the HTTP server listens on (serve)
 CFG.setdefault("RESTRICTED", ["main.py", "config.json", "index.html"])  # Files protected from web edits
 CFG.setdefault("CHUNK", 4096)                  # I/O block size for file streams (upload/download)
-CFG.setdefault("MAX_SINGLE_SEND", 512)         # Max bytes per socket.write() call (send_all)
+CFG.setdefault("MAX_BODY", 4096)               # Largest request body buffered in RAM (JSON APIs)
+CFG.setdefault("UPLOAD_IDLE_MS", 30000)        # Close the file handle of an upload idle this long
+CFG.setdefault("UPLOAD_FORGET_MS", 600000)     # Drop an idle upload session (no resume after this)
+CFG.setdefault("UPLOAD_MAX_SESSIONS", 4)       # Concurrent upload sessions; the oldest idle one is evicted
+CFG.setdefault("MAX_SINGLE_SEND", 512)         # Max bytes per socket.write() call (send_file)
+CFG.setdefault("MAX_CONN", 4)                  # Simultaneous client connections (handle_client)
+CFG.setdefault("CONN_WAIT_MS", 2000)           # Max wait for a free slot before a new connection gets 503
+CFG.setdefault("READ_TIMEOUT_MS", 5000)        # Max wait for each header line / body part
+CFG.setdefault("WRITE_TIMEOUT_MS", 5000)       # Max wait for a client to take more response bytes
+CFG.setdefault("IDLE_TIMEOUT_MS", 10000)       # Max wait for a request line on a new connection
+CFG.setdefault("KEEPALIVE_TIMEOUT_MS", 5000)   # Max wait for the next request on a kept-alive connection
+CFG.setdefault("KEEPALIVE_MAX", 20)            # Requests served per connection before it is closed
+CFG.setdefault("MAX_REQUESTS", 4)              # Requests handled at once; chat/scan may take all but one
+CFG.setdefault("HEAP_LOW_WATER", 24576)        # Free heap (after gc.collect) below which requests get 503
+CFG.setdefault("RATE_LIMIT", 20)               # Requests/s per client IP (token bucket refill); 0 = off
+CFG.setdefault("RATE_BURST", 40)               # Token bucket size: requests a client may fire at once
+CFG.setdefault("RETRY_AFTER", 2)               # Seconds advertised in Retry-After on 503
+CFG.setdefault("WRITE_BEHIND_BLOCKS", 4)       # CHUNK-sized RAM blocks for queued writes; 0 = write through
+CFG.setdefault("WRITE_BEHIND_DELAY_MS", 20)    # Wait before flushing, so adjacent writes coalesce
+CFG.setdefault("CACHE_MAX_AGE", {".ico": 3600, "*": 0})  # Browser cache seconds per extension (0 = revalidate)
+CFG.setdefault("BUNDLE_MAX_AGE", 60)           # Browser cache seconds for /api/bundle (0 = revalidate)
+CFG.setdefault("BUNDLE_REBUILD_MS", 3000)      # Quiet time after an app/icon change before bundle.json.gz is rebuilt; 0 = never
+CFG.setdefault("API_MODULES", [])             # Handler modules imported at boot; each has setup(server)
+CFG.setdefault("PRELOAD_MODULES", [])         # Feature modules imported at boot instead of on first use
+CFG.setdefault("DISABLED_MODULES", [])        # Feature modules never loaded (their routes 404)
+CFG.setdefault("LOG_LEVEL", "info")           # Lowest level kept in the /api/log ring: debug|info|warn|error
+CFG.setdefault("LOG_SERIAL_LEVEL", "info")    # Lowest level also printed over USB serial
+CFG.setdefault("LOG_LEN", 64)                  # Lines kept for /api/log
+CFG.setdefault("STATS_MAX_ROUTES", 32)         # Routes tracked by /api/stats; the rest count as "other"
+CFG.setdefault("INFO_SAMPLE_MS", 5000)         # Telemetry sampling period (/api/info snapshot, history)
+CFG.setdefault("INFO_HISTORY_LEN", 60)         # Samples kept for /api/info/history
+CFG.setdefault("CHAT_WAIT_MS", 25000)          # Longest chat long-poll; also the SSE keep-alive ping interval
+CFG.setdefault("CHAT_MAX_WAITERS", 2)          # Chat clients parked at once; further streams get 503, polls no wait
+CFG.setdefault("STA_TIMEOUT_MS", 20000)        # STA join attempt; the AP serves meanwhile and stays up on failure
+CFG.setdefault("WIFI_CHECK_MS", 10000)         # STA link check; a lost link brings the AP up until it rejoins
+CFG.setdefault("SCAN_TTL_MS", 30000)           # /api/scan results older than this are refreshed in the background
 
 AP_NAME         = CFG["AP_NAME"]
 AP_PASS         = CFG["AP_PASS"]                   # re-use single password field
 PORT            = CFG["PORT"]
 RESTRICTED      = set(CFG["RESTRICTED"])       # convert to set for O(1) lookups
 CHUNK           = CFG["CHUNK"]
+MAX_BODY        = CFG["MAX_BODY"]
 MAX_SINGLE_SEND = CFG["MAX_SINGLE_SEND"]
+MAX_CONN        = CFG["MAX_CONN"]
+CONN_WAIT_MS    = CFG["CONN_WAIT_MS"]
+READ_TIMEOUT    = CFG["READ_TIMEOUT_MS"] / 1000   # asyncio.wait_for() takes seconds
+WRITE_TIMEOUT   = CFG["WRITE_TIMEOUT_MS"] / 1000
+IDLE_TIMEOUT    = CFG["IDLE_TIMEOUT_MS"] / 1000
+KEEPALIVE_TIMEOUT = CFG["KEEPALIVE_TIMEOUT_MS"] / 1000
+KEEPALIVE_MAX   = CFG["KEEPALIVE_MAX"]
+MAX_REQUESTS    = CFG["MAX_REQUESTS"]
+HEAP_LOW_WATER  = CFG["HEAP_LOW_WATER"]
+RATE_LIMIT      = CFG["RATE_LIMIT"]
+RATE_BURST      = CFG["RATE_BURST"]
+RETRY_AFTER     = CFG["RETRY_AFTER"]
+CACHE_MAX_AGE   = CFG["CACHE_MAX_AGE"]
+LOG_LEVEL       = LOG_LEVELS.get(CFG["LOG_LEVEL"], 20)
+LOG_SERIAL      = LOG_LEVELS.get(CFG["LOG_SERIAL_LEVEL"], 20)
+LOG_RING        = [None] * CFG["LOG_LEN"]
+STA_TIMEOUT_MS  = CFG["STA_TIMEOUT_MS"]
+WIFI_CHECK_MS   = CFG["WIFI_CHECK_MS"]
 
 LED = Pin("LED", Pin.OUT)                    # on-board LED indicator
 # ----------------------------------------------------------
@@ -107,8 +188,16 @@ def start_ap() -> network.WLAN:
     return ap
 
 
-def connect_sta(timeout: int = 20) -> bool:
-    """Attempt STA connection; return True on success."""
+def stop_ap() -> None:
+    """Shut the access point down (STA took over)."""
+    ap = network.WLAN(network.AP_IF)
+    if ap.active():
+        ap.active(False)
+        log("AP stopped")
+
+
+async def connect_sta(timeout_ms: int = STA_TIMEOUT_MS) -> bool:
+    """Attempt STA connection without blocking other clients; True on success."""
     sta = network.WLAN(network.STA_IF)
     if sta.isconnected():
         log(f"STA already connected: {sta.ifconfig()}")
@@ -119,430 +208,1214 @@ def connect_sta(timeout: int = 20) -> bool:
     sta.config(hostname=CFG["hostname"])
     sta.connect(CFG["ssid"], CFG["psk"])
 
-    for i in range(timeout):
+    t0 = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), t0) < timeout_ms:
         if sta.isconnected():
             log(f"STA connected: {sta.ifconfig()}")
             return True
-        log(f"STA retry {i+1}/{timeout}")
-        time.sleep(1)
+        if sta.status() < 0:                # wrong password / no such AP / join failed
+            break
+        await asyncio.sleep_ms(250)
 
-    log("STA failed")
+    log(f"STA failed (status {sta.status()})", "warn")
     sta.active(False)
     return False
 
 
+WIFI_STATE = "down"             # "connecting" → "sta" or "ap" (read by pwd_wifi, pwd_info)
+
+def _wifi_set(state: str, led: str) -> None:
+    global WIFI_STATE
+    WIFI_STATE = state
+    set_led_state(led)
+
+
+async def wifi_task() -> None:
+    """Bring up what config.json asks for, then watch the STA link.
+
+    Runs beside serve(), so the server listens from the start: on the AP
+    while STA is pending, and on the AP for good if STA fails (no reboot).
+    A lost STA link brings the AP back until the network returns.
+    """
+    boot_mode = CFG.get("mode", "AP").strip().upper()
+    log(f"Boot mode requested: {boot_mode}")
+    ssid = CFG.get("ssid", "").strip()
+    sta = network.WLAN(network.STA_IF)
+
+    if boot_mode == "STA" and ssid:
+        _wifi_set("connecting", "connecting")
+        if not sta.isconnected():
+            start_ap()                      # reachable while STA is pending
+        if await connect_sta():
+            CFG["mode"] = "STA"             # ensure persistence
+            stop_ap()
+            _wifi_set("sta", "connected")
+            log("Running in STA mode")
+        else:
+            log("STA failed → staying on AP", "warn")
+            CFG["mode"] = "AP"              # force AP for next boot
+            save_config()
+    elif boot_mode == "STA":
+        log("No SSID → forcing AP")
+        CFG["mode"] = "AP"
+        save_config()
+    else:
+        log("AP mode requested")            # Explicit AP
+
+    if WIFI_STATE != "sta":
+        if not network.WLAN(network.AP_IF).active():
+            start_ap()
+        _wifi_set("ap", "ap")
+        log("Running in AP mode")
+    boot_mark("wifi")
+
+    while CFG["mode"] == "STA":
+        await asyncio.sleep_ms(WIFI_CHECK_MS)
+        if WIFI_STATE == "sta" and not sta.isconnected():
+            log("STA link lost → AP up while reconnecting", "warn")
+            start_ap()
+            _wifi_set("ap", "ap")
+        elif WIFI_STATE == "ap":
+            _wifi_set("connecting", "connecting")
+            if await connect_sta():
+                stop_ap()
+                _wifi_set("sta", "connected")
+                log("STA link back")
+            else:
+                _wifi_set("ap", "ap")
+
+
 # ----------------------------------------------------------
 # 5.  GENERIC HTTP HELPERS
+#     Every helper writes to the asyncio stream of one client
 # ----------------------------------------------------------
-def send(cl: socket.socket, data, mime: str = "text/html", code: int = 200) -> None:
+REASONS = {200: "OK", 206: "Partial Content", 304: "Not Modified", 400: "Bad Request", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 406: "Not Acceptable",
+           412: "Precondition Failed",
+           413: "Payload Too Large", 416: "Range Not Satisfiable",
+           429: "Too Many Requests",
+           500: "Internal Server Error", 503: "Service Unavailable",
+           507: "Insufficient Storage"}
+
+
+class HTTPError(Exception):
+    """Raised by a handler (or a helper it calls) to answer *code* instead.
+
+    handle_request() sends it, with *msg* as the body, if nothing was sent yet.
+    """
+
+    def __init__(self, code: int, msg: str = "") -> None:
+        super().__init__(code, msg)
+        self.code = code
+        self.msg = msg
+
+
+def parse_query(path: str) -> dict:
+    """Split '?a=1&b&c=x' into {"a": "1", "b": "", "c": "x"}."""
+    if '?' not in path:
+        return {}
+    params = {}
+    for kv in path.split('?', 1)[1].split('&'):
+        if kv:
+            key, _, value = kv.partition('=')
+            params[key] = value
+    return params
+
+
+def ends_any(s: str, suffixes) -> bool:
+    """s.endswith(suffixes) for a tuple – MicroPython's endswith() takes one str."""
+    for suffix in suffixes:
+        if s.endswith(suffix):
+            return True
+    return False
+
+
+def starts_any(s: str, prefixes) -> bool:
+    """s.startswith(prefixes) for a tuple (see ends_any)."""
+    for prefix in prefixes:
+        if s.startswith(prefix):
+            return True
+    return False
+
+
+class Request:
+    """One parsed HTTP request plus the client stream its response goes to."""
+
+    def __init__(self, r, w, method: str, path: str, version: str, headers: dict) -> None:
+        self.r = r
+        self.w = w
+        self.method = method
+        self.path = path                        # full path incl. query string
+        self.clean_path = path.split('?')[0]
+        if self.clean_path == "/":
+            self.clean_path = "/index.html"
+        self.query = parse_query(path)
+        self.headers = headers                  # lower-case names → str values
+        self.remaining = int(headers.get("content-length", 0))   # unread body bytes
+        conn = headers.get("connection", "").lower()
+        self.keep_alive = ("close" not in conn if version == "HTTP/1.1"
+                           else "keep-alive" in conn)
+        self.sent = False                       # True once the status line is out
+        self.status = 0                         # response code, for /api/stats
+        self.bytes_in = 0                       # request head + body bytes
+        self.bytes_out = 0                      # response head + declared body bytes
+        self.parse_us = 0                       # request line → end of headers
+        self.head_us = 0                        # ticks_us() when send_head() ran
+        self.route = "static"                   # matched route pattern (handle_request)
+
+
+def send_head(req: Request, code: int = 200, mime: str = None,
+              length: int = 0, extra: str = "") -> None:
+    """Queue status line + headers; responses are framed by Content-Length,
+    except length=None: the body then runs until the connection closes."""
+    req.sent = True
+    req.status = code
+    req.head_us = time.ticks_us()
+    head = f"HTTP/1.1 {code} {REASONS.get(code, 'OK')}\r\n"
+    if mime:
+        head += f"Content-Type: {mime}\r\n"
+    if length is None:
+        req.keep_alive = False
+    elif code != 304:                           # 304 never has a body
+        head += f"Content-Length: {length}\r\n"
+    if req.keep_alive:
+        head += (f"Connection: keep-alive\r\n"
+                 f"Keep-Alive: timeout={int(KEEPALIVE_TIMEOUT)}\r\n")
+    else:
+        head += "Connection: close\r\n"
+    head = (head + extra + "\r\n").encode()
+    req.bytes_out = len(head) + (0 if req.method == "HEAD" else length or 0)
+    req.w.write(head)
+
+
+async def drain(w) -> None:
+    """Wait until *w* has taken what was written to it.
+
+    A client that stops reading for WRITE_TIMEOUT raises OSError, like a
+    reset peer, so its connection is closed and its slot freed. The timeout
+    (a Task per wait_for) is only paid when the socket left data in out_buf.
+    """
+    if getattr(w, "out_buf", None) == b"":      # MicroPython Stream, nothing pending
+        await w.drain()
+        return
+    try:
+        await asyncio.wait_for(w.drain(), WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise OSError("write timeout")
+
+
+async def send(req: Request, data, mime: str = "text/html", code: int = 200) -> None:
     """Send a complete HTTP response (small payloads)."""
-    cl.send(f"HTTP/1.1 {code} OK\r\nContent-Type:{mime}\r\n\r\n".encode())
-    cl.send(data.encode() if isinstance(data, str) else data)
+    if isinstance(data, str):
+        data = data.encode()
+    send_head(req, code, mime, len(data))
+    req.w.write(data)
+    await drain(req.w)
+
+
+# ---- Route table (filled by @route, read by handle_request) ----
+ROUTES   = {}                   # "/api/list"  → (methods, handler(req))
+PREFIXES = {}                   # "/api/read/" → (methods, handler(req, rest_of_path))
+                                # methods None = any (feature-module stubs)
+
+
+def route(path: str, methods: tuple = ("GET",), prefix: bool = False):
+    """Decorator registering an async handler for *path*.
+
+    prefix=True claims every path below *path*, which must end in "/"
+    (e.g. "/api/read/" or "/myapp/"); the handler then also gets the
+    remainder (a file name). The longest matching prefix wins.
+    Any other method is answered with 405.
+    """
+    if not path.startswith("/") or (prefix and not path.endswith("/")):
+        raise ValueError(f"bad route {path}")
+
+    def register(handler):
+        (PREFIXES if prefix else ROUTES)[path] = (methods, handler)
+        return handler
+    return register
+
+
+def clean_name(name: str) -> str:
+    """A file name from a URL or request body, as stored on flash.
+
+    Leading './' is dropped, so './main.py' can't dodge RESTRICTED;
+    absolute paths and '.'/'..' parts raise HTTPError 400.
+    """
+    while name.startswith("./"):
+        name = name[2:]
+    parts = name.split("/")
+    if name.startswith("/") or "." in parts or ".." in parts:
+        raise HTTPError(400, "Bad file name")
+    return name
+
+
+def core():
+    """This module, as handed to feature and API modules' setup()."""
+    import __main__             # main.py runs as __main__ on the Pico (tools/host aliases it)
+    return __main__
+
+
+# ---- Conditional GET (ETag / Last-Modified → 304) ----
+FILE_VERSIONS = {}              # { "<filename>": times written/deleted since boot }
+FS_GEN = 0                      # bumped by every touch(): flash-wide caches (free space) re-read
+BOOT_ID = "%02x%02x" % tuple(os.urandom(2))   # keeps post-boot ETags unique across reboots
+DAYS   = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+          "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def touch(name: str) -> None:
+    """Record that *name* changed on flash (call after write/upload/delete).
+
+    Invalidates its cached validators and refreshes its /api/list entry.
+    """
+    global FS_GEN
+    FILE_VERSIONS[name] = FILE_VERSIONS.get(name, 0) + 1
+    FS_GEN += 1
+    index_update(name)
+    if name != BUNDLE and ends_any(logical_name(name), (".html", ".ico")):
+        bundle_changed()
+
+
+def http_date(secs: int) -> str:
+    """Format a timestamp as an RFC 7231 date (Last-Modified)."""
+    t = time.gmtime(secs)
+    return (f"{DAYS[t[6]]}, {t[2]:02d} {MONTHS[t[1] - 1]} {t[0]} "
+            f"{t[3]:02d}:{t[4]:02d}:{t[5]:02d} GMT")
+
+
+def file_validators(name: str, st) -> tuple:
+    """Return (etag, last_modified) for a file from its os.stat() result."""
+    size, mtime = st[6], st[8]
+    ver = FILE_VERSIONS.get(name)
+    if ver:
+        etag = f'"{size:x}-{mtime:x}-{BOOT_ID}.{ver}"'
+    else:
+        etag = f'"{size:x}-{mtime:x}"'
+    return etag, (http_date(mtime) if mtime else None)
 
 
-async def send_all(sock: socket.socket, data: bytes) -> None:
-    """Send entire byte buffer, coping with short writes."""
-    mv = memoryview(data)
-    sent = 0
-    while sent < len(mv):
-        try:
-            n = sock.write(mv[sent:sent + MAX_SINGLE_SEND])
-            if n is None:                   # non-blocking path (not used here)
-                await asyncio.sleep_ms(10)
-                continue
-            sent += n
-        except OSError as e:
-            if e.errno == 11:               # EAGAIN
-                await asyncio.sleep_ms(10)
-                continue
-            raise
+def cache_headers(etag: str, last_modified, max_age=None) -> str:
+    """Header block for a cacheable file (max_age None = API, always revalidate)."""
+    head = f"ETag: {etag}\r\n"
+    if last_modified:
+        head += f"Last-Modified: {last_modified}\r\n"
+    if max_age:
+        return head + f"Cache-Control: max-age={max_age}\r\n"
+    return head + "Cache-Control: no-cache\r\n"
 
 
-async def recv_exact(sock: socket.socket, wanted: int) -> bytes:
-    """Block until exactly *wanted* bytes are received."""
-    buf = b''
-    while len(buf) < wanted:
-        part = sock.recv(wanted - len(buf))
-        if not part:
-            raise OSError("Connection closed")
-        buf += part
-    return buf
+def cache_max_age(name: str) -> int:
+    """Cache lifetime for a static file, looked up by extension in CACHE_MAX_AGE."""
+    dot = name.rfind(".")
+    ext = name[dot:] if dot >= 0 else ""
+    return CACHE_MAX_AGE.get(ext, CACHE_MAX_AGE.get("*", 0))
 
 
-# ----------------------------------------------------------
-# 6.  FILE UPLOAD STREAMING
-# ----------------------------------------------------------
-UPLOADS = {}                    # { "<filename>:<token>": file_object }
-
-def _close_upload(name: str) -> None:
-    """Flush, close and remove upload entry."""
-    if name in UPLOADS:
-        UPLOADS[name].flush()
-        UPLOADS[name].close()
-        del UPLOADS[name]
-
-
-async def handle_upload(cl: socket.socket, path: str, body: bytes) -> None:
-    """Handle chunked file upload via /api/upload/<filename>?offset=X&token=Y&done"""
-    path_only = path.split('?')[0]
-    name = path_only[len("/api/upload/"):]
-    qs = path.split('?')[1] if '?' in path else ''
-    params = {kv.split('=')[0]: kv.split('=')[1] for kv in qs.split('&') if kv}
-
-    offset = int(params.get('offset', 0))
-    token  = params.get('token', '0')
-    done   = params.get('done') is not None
-    key = f"{name}:{token}"
-
-    if name in RESTRICTED:
-        send(cl, "", code=403)
+def is_fresh(req: Request, etag: str, last_modified) -> bool:
+    """True when the client's cached copy is still valid (If-None-Match wins)."""
+    inm = req.headers.get("if-none-match")
+    if inm is not None:
+        return inm == "*" or etag in inm
+    ims = req.headers.get("if-modified-since")
+    return ims is not None and ims == last_modified
+
+
+async def send_not_modified(req: Request, headers: str) -> None:
+    """Answer a conditional GET whose validators still match."""
+    send_head(req, 304, extra=headers)
+    await drain(req.w)
+
+
+# ---- Pre-compressed variants (<name>.gz from package-gzip.sh) ----
+GZ_TYPES = (".html", ".ico", ".css", ".js", ".svg")   # keep in sync with package-gzip.sh
+
+
+def gz_size(path: str) -> int:
+    """Uncompressed size of a .gz file (ISIZE field of the gzip trailer)."""
+    with open(path, "rb") as f:
+        f.seek(-4, 2)
+        return int.from_bytes(f.read(4), "little")
+
+
+def is_restricted(name: str) -> bool:
+    """True for a protected file and for the .gz that would stand in for it."""
+    return name in RESTRICTED or (name.endswith(".gz") and name[:-3] in RESTRICTED)
+
+
+def drop_gz(name: str) -> bool:
+    """Remove the .gz sibling of *name* so it can't shadow newer content."""
+    if not ends_any(name, GZ_TYPES):
+        return False
+    try:
+        os.remove(name + ".gz")
+        touch(name + ".gz")
+        return True
+    except OSError:
+        return False
+
+
+def pick_variant(req: Request, name: str) -> tuple:
+    """Choose the stored file that answers a request for *name*.
+
+    Returns (path, stat, coding): coding is "gzip" when the .gz is sent
+    as-is with Content-Encoding, "gunzip" when only the .gz exists and the
+    client can't take it, None for the raw file. Raises OSError if neither
+    exists; open_variant() raises HTTPError 406 for "gunzip" without deflate.
+    """
+    wb_drain(name)                              # queued writes land first
+    wb_drain(name + ".gz")
+    if ends_any(name, GZ_TYPES):
+        gz = name + ".gz"
+        if "gzip" in req.headers.get("accept-encoding", ""):
+            try:
+                return gz, os.stat(gz), "gzip"
+            except OSError:
+                pass
+        try:
+            return name, os.stat(name), None
+        except OSError:
+            return gz, os.stat(gz), "gunzip"
+    return name, os.stat(name), None
+
+
+def open_variant(path: str, st, coding) -> tuple:
+    """Open a picked variant; returns (file, body_length, extra_headers, etag, last_modified)."""
+    etag, modified = file_validators(path, st)
+    if coding == "gzip":
+        return (open(path, "rb"), st[6],
+                "Content-Encoding: gzip\r\nVary: Accept-Encoding\r\n",
+                etag[:-1] + '-gz"', modified)
+    if coding == "gunzip":
+        if deflate is None:
+            raise HTTPError(406, "gzip only")     # no deflate module to inflate it
+        f = deflate.DeflateIO(open(path, "rb"), deflate.GZIP, 0, True)
+        return f, gz_size(path), "Vary: Accept-Encoding\r\n", etag, modified
+    extra = "Vary: Accept-Encoding\r\n" if ends_any(path, GZ_TYPES) else ""
+    return open(path, "rb"), st[6], extra, etag, modified
+
+
+# ---- Send engine: pooled buffers, readinto() + memoryview writes ----
+BUF_POOL = []                   # free (buffer, memoryview, slices) sets, reused across transfers
+
+
+def _get_io_buf() -> tuple:
+    """Take an I/O buffer from the pool (allocated once, on first demand)."""
+    if BUF_POOL:
+        return BUF_POOL.pop()
+    buf = bytearray(CHUNK)
+    mv = memoryview(buf)
+    return buf, mv, [mv[i:i + MAX_SINGLE_SEND] for i in range(0, CHUNK, MAX_SINGLE_SEND)]
+
+
+async def send_file(w, f, size: int) -> None:
+    """Stream *size* bytes of file *f* to *w* without per-chunk allocations.
+
+    The file is read with readinto() into a pooled bytearray and written as
+    pre-cut memoryview slices of MAX_SINGLE_SEND bytes. drain() after each
+    slice waits for the socket to become writable (and yields to other
+    clients). At most one buffer per active transfer exists, so large
+    downloads neither grow nor fragment the heap.
+    """
+    item = _get_io_buf()
+    buf, mv, slices = item
+    sent = 0
+    try:
+        while sent < size:
+            want = size - sent
+            n = f.readinto(buf if want >= CHUNK else mv[:want])
+            if not n:
+                break
+            if n == CHUNK:
+                for part in slices:
+                    w.write(part)
+                    await drain(w)
+            else:
+                for i in range(0, n, MAX_SINGLE_SEND):
+                    w.write(mv[i:min(i + MAX_SINGLE_SEND, n)])
+                    await drain(w)
+            sent += n
+    finally:
+        BUF_POOL.append(item)
+    if sent < size:                     # file shrank: framing is broken, drop connection
+        raise OSError("short read")
+
+
+# ---- Byte ranges (Range → 206 Partial Content / 416) ----
+def byte_range(req: Request, size: int, etag: str, last_modified):
+    """The single byte range a GET asks for, as (first, last) inclusive.
+
+    None = send the whole file (no Range, several ranges, a malformed one,
+    or an If-Range that no longer matches); False = unsatisfiable (416).
+    """
+    rng = req.headers.get("range")
+    if not rng or not rng.startswith("bytes=") or "," in rng:
+        return None
+    if_range = req.headers.get("if-range")
+    if if_range is not None and if_range != etag and if_range != last_modified:
+        return None
+    first, _, last = rng[6:].strip().partition("-")
+    try:
+        if not first:                       # "-N": the last N bytes
+            n = int(last)
+            return (max(0, size - n), size - 1) if n > 0 and size else False
+        first = int(first)
+        last = int(last) if last else None
+    except ValueError:
+        return None
+    if last is not None and last < first:
+        return None
+    if first >= size:
+        return False
+    return first, size - 1 if last is None else min(last, size - 1)
+
+
+async def send_file_ranged(req: Request, f, size: int, mime: str, headers: str,
+                           etag: str, last_modified, seekable: bool = True) -> None:
+    """Send file *f*: whole (200), or the requested range (206, seeked to) or 416.
+
+    seekable=False (a .gz inflated on the fly) always sends the whole file.
+    A HEAD request gets the same status and headers, without the body.
+    """
+    if seekable:
+        headers += "Accept-Ranges: bytes\r\n"
+        rng = byte_range(req, size, etag, last_modified)
+    else:
+        headers += "Accept-Ranges: none\r\n"
+        rng = None
+    if rng is False:
+        send_head(req, 416, "text/plain", 0, headers + f"Content-Range: bytes */{size}\r\n")
+        await drain(req.w)
         return
+    if rng is None:
+        first, last = 0, size - 1
+        send_head(req, 200, mime, size, headers)
+    else:
+        first, last = rng
+        f.seek(first)
+        send_head(req, 206, mime, last - first + 1,
+                  headers + f"Content-Range: bytes {first}-{last}/{size}\r\n")
+    if req.method == "HEAD":
+        await drain(req.w)
+    else:
+        await send_file(req.w, f, last - first + 1)
+
+
+# ---- Request bodies: read from the socket on demand, never whole ----
+async def recv_into(req: Request, mv) -> int:
+    """Read up to len(mv) body bytes into *mv*; 0 once the body is used up."""
+    want = min(len(mv), req.remaining)
+    if not want:
+        return 0
+    n = await asyncio.wait_for(req.r.readinto(mv if want == len(mv) else mv[:want]),
+                               READ_TIMEOUT)
+    if not n:
+        raise OSError("Connection closed")
+    req.remaining -= n
+    return n
+
+
+async def read_body(req: Request) -> bytes:
+    """Read a small body (JSON payloads) into RAM with a single allocation.
+
+    Raises HTTPError 413 when it is over MAX_BODY.
+    """
+    if req.remaining > MAX_BODY:
+        raise HTTPError(413, "Body too large")
+    buf = bytearray(req.remaining)
+    mv = memoryview(buf)
+    got = 0
+    while req.remaining:
+        got += await recv_into(req, mv[got:])
+    return bytes(buf)
+
+
+def wb_drain(name: str = None) -> None:
+    """Put the writes queued for *name* (all, if None) on flash.
+
+    The write-behind queue lives in pwd_write, imported by the modules
+    that write; until one of them is loaded there is nothing queued.
+    """
+    W = sys.modules.get("pwd_write")
+    if W is not None and W.WB_QUEUE:
+        W.wb_drain(name)
+
+
+async def discard_body(req: Request) -> None:
+    """Skip body bytes a handler did not consume, keeping the connection in sync."""
+    item = _get_io_buf()
+    try:
+        while req.remaining:
+            await recv_into(req, item[1])
+    finally:
+        BUF_POOL.append(item)
+
+
+async def close_stream(w) -> None:
+    """Close a client stream, ignoring peers that already went away."""
+    try:
+        w.close()
+        await asyncio.wait_for(w.wait_closed(), WRITE_TIMEOUT)
+    except Exception:
+        pass
 
-    # First chunk – create file
-    if key not in UPLOADS and offset == 0:
-        free = os.statvfs("/")[0] * os.statvfs("/")[3]
-        UPLOADS[key] = open(name, "wb")
 
-    if key not in UPLOADS:
-        send(cl, "Bad token", code=400)
+# ----------------------------------------------------------
+# 6.  FILE METADATA INDEX
+#     /api/list is answered from memory: the index is built once
+#     at boot and patched by touch() whenever a file changes.
+# ----------------------------------------------------------
+FILE_INDEX = {}                 # { "<logical name>": {"name", "size", "restricted"} }
+INDEX_GEN  = 0                  # bumped on every change; clients see index_gen()
+CHANGED_AT = {}                 # { "<logical name>": generation of its last change }
+REMOVED    = {}                 # tombstones { "<logical name>": generation removed }
+MAX_TOMBSTONES = 32
+INDEX_FLOOR = 0                 # deltas from before this generation need a full list
+LIST_CACHE = {}                 # { "<ext>|<prefix>": serialized JSON of that listing }
+
+
+def logical_name(fname: str) -> str:
+    """Name a file is listed under ('<asset>.gz' → '<asset>')."""
+    if fname.endswith(".gz") and ends_any(fname[:-3], GZ_TYPES):
+        return fname[:-3]
+    return fname
+
+
+def _index_entry(name: str):
+    """Metadata for logical *name* (raw file first, then its .gz), or None."""
+    try:
+        size = os.stat(name)[6]
+    except OSError:
+        if not ends_any(name, GZ_TYPES):
+            return None
+        try:
+            size = gz_size(name + ".gz")
+        except OSError:
+            return None
+    return {"name": name, "size": size, "restricted": name in RESTRICTED}
+
+
+def index_gen() -> str:
+    """Generation token ("<BOOT_ID>.<gen>") for ETags and ?since=; unique across reboots."""
+    return f"{BOOT_ID}.{INDEX_GEN}"
+
+
+def build_index() -> None:
+    """Scan the filesystem once (boot)."""
+    global INDEX_GEN, INDEX_FLOOR
+    FILE_INDEX.clear()
+    CHANGED_AT.clear()
+    REMOVED.clear()
+    for fname in os.listdir():
+        name = logical_name(fname)
+        if name not in FILE_INDEX:
+            entry = _index_entry(name)
+            if entry:
+                FILE_INDEX[name] = entry
+    INDEX_GEN += 1
+    INDEX_FLOOR = INDEX_GEN         # no delta reaches back past the scan
+    LIST_CACHE.clear()
+
+
+def index_update(fname: str) -> None:
+    """Re-stat one changed file and patch its entry (O(1), no directory scan)."""
+    global INDEX_GEN, INDEX_FLOOR
+    name = logical_name(fname)
+    entry = _index_entry(name)
+    if entry == FILE_INDEX.get(name):
         return
+    INDEX_GEN += 1
+    LIST_CACHE.clear()
+    if entry:
+        FILE_INDEX[name] = entry
+        CHANGED_AT[name] = INDEX_GEN
+        REMOVED.pop(name, None)
+    elif name in FILE_INDEX:
+        del FILE_INDEX[name]
+        CHANGED_AT.pop(name, None)
+        REMOVED[name] = INDEX_GEN
+        if len(REMOVED) > MAX_TOMBSTONES:
+            oldest = min(REMOVED, key=REMOVED.get)
+            INDEX_FLOOR = REMOVED.pop(oldest)
+
+
+def _index_match(name: str, exts, prefix: str) -> bool:
+    return name.startswith(prefix) and (not exts or ends_any(name, exts))
+
+
+def index_json(exts: tuple, prefix: str) -> str:
+    """Serialized (optionally filtered) listing, cached until the next change."""
+    key = f"{'|'.join(exts)}|{prefix}"
+    data = LIST_CACHE.get(key)
+    if data is None:
+        data = json.dumps([e for e in FILE_INDEX.values()
+                           if _index_match(e["name"], exts, prefix)])
+        if len(LIST_CACHE) >= 4:
+            LIST_CACHE.clear()
+        LIST_CACHE[key] = data
+    return data
+
+
+def index_delta(since: str, exts: tuple, prefix: str) -> str:
+    """Entries changed / removed after generation token *since* (?since=).
+
+    A token from another boot, or one older than the tombstones reach,
+    gets the full list ("full": true). Raises ValueError if it is malformed.
+    """
+    boot, _, gen = since.rpartition(".")
+    gen = int(gen)
+    if boot != BOOT_ID or not INDEX_FLOOR <= gen <= INDEX_GEN:
+        return json.dumps({"gen": index_gen(), "full": True,
+                           "changed": [e for e in FILE_INDEX.values()
+                                       if _index_match(e["name"], exts, prefix)],
+                           "removed": []})
+    return json.dumps({"gen": index_gen(), "full": False,
+                       "changed": [FILE_INDEX[n] for n in CHANGED_AT
+                                   if CHANGED_AT[n] > gen and _index_match(n, exts, prefix)],
+                       "removed": [n for n in REMOVED
+                                   if REMOVED[n] > gen and _index_match(n, exts, prefix)]})
+
+
+# ---- Desktop bundle (/api/bundle, served by pwd_bundle) ----
+#      bundle.json.gz is the prebuilt, gzipped bundle. It is dropped as soon as
+#      an app or icon changes, whether or not pwd_bundle is loaded to rebuild it.
+BUNDLE = "bundle.json.gz"
+RESTRICTED.update((BUNDLE, BUNDLE + ".tmp"))   # only pwd_bundle's builder writes them
+
+
+def bundle_changed() -> None:
+    """An app or icon changed: drop the stale prebuilt file, tell pwd_bundle."""
+    if "pwd_bundle" in LOADED:
+        LOADED["pwd_bundle"].changed()
+    try:
+        os.remove(BUNDLE)
+    except OSError:
+        return
+    index_update(BUNDLE)
 
-    f = UPLOADS[key]
-    f.seek(offset)
-    f.write(body)
 
-    if done:
-        _close_upload(key)
+# ----------------------------------------------------------
+# 7.  REQUEST METRICS
+#     handle_client() counts requests and hands each finished one
+#     to REQUEST_HOOKS; pwd_info keeps the /api/stats counters there.
+# ----------------------------------------------------------
+REQ_COUNT = 0                           # requests served since boot
+STATS_REJECTED = 0                      # connections turned away with 503 (handle_client)
+REQUEST_HOOKS = []                      # hook(req, t0_us, heap_free_before) after every request
+
 
-    send(cl, "OK")
+def request_done(req: Request, t0: int, mem: int) -> None:
+    """Run the hooks for one finished request; t0/mem were taken before its handler ran."""
+    for hook in REQUEST_HOOKS:
+        hook(req, t0, mem)
 
 
 # ----------------------------------------------------------
-# 7.  IN-MEMORY CHAT SYSTEM
+# 8.  FEATURE MODULES
+#     Everything beyond serving the desktop lives in pwd_*.py and
+#     is imported on its first request: a stub owns the module's
+#     routes until then, and setup() replaces it with the real
+#     handlers. Modules can be preloaded, disabled or unloaded.
 # ----------------------------------------------------------
-CHAT_HISTORY = []               # [{"id":int, "name":str, "message":str}, …]
-CHAT_SEQ     = 0
-MAX_CHAT_LEN = 50
+FEATURES = {                    # module → routes it serves ("…/" = prefix route)
+    "pwd_files":  ("/api/read/", "/api/write/", "/api/patch/", "/api/download/", "/api/delete/",
+                   "/api/rename/", "/api/copy/", "/api/batch"),
+    "pwd_upload": ("/api/upload/", "/api/upload/status"),
+    "pwd_chat":   ("/api/chat/history", "/api/chat/poll", "/api/chat/stream",
+                   "/api/chat/send"),
+    "pwd_info":   ("/api/info", "/api/info/history", "/api/stats", "/api/log"),
+    "pwd_wifi":   ("/api/scan", "/api/connect", "/api/mode/ap", "/api/mode/sta"),
+    "pwd_bundle": ("/api/bundle",),
+}
+LIBRARIES = ("pwd_write",)     # imported by feature modules, never routed or unloaded
+LOADED    = {}                  # module name → module object
+RELEASERS = []                  # callables freeing one parked connection (→ True), see handle_client
+# Code that gets imported must never be writable over the web
+RESTRICTED.update(m + ext for m in list(FEATURES) + list(LIBRARIES) + CFG["API_MODULES"]
+                  for ext in (".py", ".mpy"))
+
+
+def _feature_stub(mod: str):
+    async def load_and_dispatch(req: Request, *args) -> None:
+        if mod in LOADED or mod in CFG["DISABLED_MODULES"]:   # no handler for this path
+            await send(req, "", code=404)
+        elif load_feature(mod):
+            await handle_request(req)           # setup() has replaced this stub
+        else:
+            await send(req, "Feature unavailable", code=503)
+    return load_and_dispatch
+
+
+def install_stubs(mod: str) -> None:
+    """(Re)claim a module's routes with a stub that imports it on first use."""
+    entry = (None, _feature_stub(mod))
+    for path in FEATURES[mod]:
+        (PREFIXES if path.endswith("/") else ROUTES)[path] = entry
+
+
+def load_feature(mod: str) -> bool:
+    """Import a feature module and let its setup() register the real handlers."""
+    t0, mem = time.ticks_ms(), gc.mem_free()
+    try:
+        m = __import__(mod)
+        m.setup(core())
+    except Exception as e:                      # missing file, MemoryError, bug
+        log(f"Module {mod}: {repr(e)}", "error")
+        install_stubs(mod)
+        sys.modules.pop(mod, None)
+        return False
+    LOADED[mod] = m
+    log(f"Module {mod} loaded in {time.ticks_diff(time.ticks_ms(), t0)} ms, "
+        f"{mem - gc.mem_free()} B heap")
+    return True
+
+
+def unload_feature(mod: str) -> None:
+    """Drop a loaded module (and its in-RAM state); the next request reloads it."""
+    m = LOADED.pop(mod)
+    if hasattr(m, "teardown"):
+        m.teardown()
+    install_stubs(mod)
+    sys.modules.pop(mod, None)
+    gc.collect()
+    log(f"Module {mod} unloaded")
+
+
+def release_parked() -> bool:
+    """Ask the loaded modules to let one long-held connection go."""
+    for release in RELEASERS:
+        if release():
+            return True
+    return False
+
 
+# ----------------------------------------------------------
+# 9.  HTTP ROUTE HANDLERS
+#     Grouped by functional area; each handler is registered
+#     with @route (section 5) and dispatched by handle_request().
+# ----------------------------------------------------------
 
-def chat_add(name: str, message: str) -> None:
-    """Append a new chat message; maintain sliding window."""
-    global CHAT_SEQ
-    CHAT_SEQ += 1
-    CHAT_HISTORY.append({
-        "id": CHAT_SEQ,
-        "name": (name[:10] if len(name) > 10 else name),
-        "message": (message[:256] if len(message) > 256 else message)
-    })
-    if len(CHAT_HISTORY) > MAX_CHAT_LEN:
-        CHAT_HISTORY.pop(0)
+# ============================================================
+# 9.1  DESKTOP API (file index)
+# ============================================================
+@route("/api/list")
+async def api_list(req: Request) -> None:
+    """List all files (name, size, restricted flag) from the index.
+
+    ?ext=.html,.ico / ?prefix=_Games_ filter; ?since=<gen> returns only
+    what changed after that generation (the "gen" of an earlier reply). Pre-compressed
+    '<name>.gz' files are listed under their logical name and size.
+    """
+    wb_drain()                              # queued writes change sizes (via touch)
+    q = req.query
+    exts = tuple(q["ext"].split(",")) if q.get("ext") else ()
+    prefix = q.get("prefix", "")
+    etag = f'"L{index_gen()}"'
+    headers = f"ETag: {etag}\r\nCache-Control: no-cache\r\n"
+    if is_fresh(req, etag, None):
+        await send_not_modified(req, headers)
+        return
+    if "since" in q:
+        data = index_delta(q["since"], exts, prefix)
+    else:
+        data = index_json(exts, prefix)
+    data = data.encode()
+    send_head(req, 200, "application/json", len(data), headers)
+    req.w.write(data)
+    await drain(req.w)
+
+
+# ============================================================
+# 9.2  SYSTEM API (config, modules, boot profile, restart)
+# ============================================================
+def save_config() -> None:
+    """Write config.json now, via a temp file: a reset never leaves it half written."""
+    with open("config.json.tmp", "w") as f:
+        f.write(json.dumps(CFG))
+    os.rename("config.json.tmp", "config.json")
+    touch("config.json")
+
+
+@route("/api/modules", ("GET", "POST"))
+async def api_modules(req: Request) -> None:
+    """Feature modules and their state; POST ?load=<mod> / ?unload=<mod>."""
+    if req.method == "POST":
+        mod = req.query.get("load") or req.query.get("unload") or ""
+        if mod not in FEATURES or mod in CFG["DISABLED_MODULES"]:
+            await send(req, "", code=404)
+            return
+        if "unload" in req.query:
+            if mod in LOADED:
+                unload_feature(mod)
+        elif mod not in LOADED and not load_feature(mod):
+            await send(req, "Feature unavailable", code=503)
+            return
+    await send(req, json.dumps({m: {"loaded": m in LOADED,
+                                    "enabled": m not in CFG["DISABLED_MODULES"]}
+                                for m in FEATURES}), "application/json")
+
+
+@route("/api/boot")
+async def api_boot(req: Request) -> None:
+    """Boot profile: ms since reset and free heap after each stage."""
+    await send(req, json.dumps([{"stage": s, "ms": t, "heap_free": h}
+                                for s, t, h in BOOT_PROFILE]), "application/json")
+
+
+@route("/api/restart", ("POST",))
+async def api_restart(req: Request) -> None:
+    """Reboot device"""
+    await send(req, "OK")
+    asyncio.create_task(reboot_later())
+
+
+# ============================================================
+# 9.3  STATIC FILE SERVING (fallback) & DISPATCH
+# ============================================================
+async def serve_static(req: Request) -> None:
+    """Any path no route claims: the file of that name from flash."""
+    clean_path = req.clean_path
+    name = clean_path[1:]
+    try:
+        path, stat, coding = pick_variant(req, name)
+        f, size, extra, etag, modified = open_variant(path, stat, coding)
+    except OSError:
+        await send(req, "", code=404)
+        return
+    with f:
+        headers = extra + cache_headers(etag, modified, cache_max_age(name))
+        if is_fresh(req, etag, modified):
+            await send_not_modified(req, headers)
+            return
+        mime = ("image/x-icon" if clean_path.endswith(".ico") else
+                "text/html"    if clean_path.endswith(".html") else
+                "text/plain")
+        await send_file_ranged(req, f, size, mime, headers, etag, modified,
+                               coding != "gunzip")
+
+
+async def handle_request(req: Request) -> None:
+    """Dispatch one parsed request and write its response to req.w.
+
+    One dict lookup for exact routes, one per "/" in the path for prefixes
+    (longest first), then the static fallback – the cost does not grow
+    with the route count.
+    The file name a prefix route gets has been through clean_name().
+    """
+    path = req.clean_path
+    entry = ROUTES.get(path)
+    if entry is not None:
+        req.route = path
+        args = ()
+    else:
+        j = path.rfind("/")
+        while j > 0:
+            entry = PREFIXES.get(path[:j + 1])
+            if entry is not None:
+                break
+            j = path.rfind("/", 0, j)
+        if entry is not None:
+            req.route = path[:j + 1] + "*"
+            args = (path[j + 1:],)
+        else:
+            entry = (("GET", "HEAD"), serve_static)
+            args = ()
+    methods, handler = entry
+    if methods and req.method not in methods:
+        send_head(req, 405, "text/plain", 0, f"Allow: {', '.join(methods)}\r\n")
+        await drain(req.w)
+        return
+    try:
+        if args:
+            args = (clean_name(args[0]),)
+        await handler(req, *args)
+    except HTTPError as e:
+        if req.sent:
+            raise
+        await send(req, e.msg, "text/plain", e.code)
+    except ValueError:                      # int() / JSON of what the client sent
+        if req.sent:
+            raise
+        await send(req, "Bad request", code=400)
 
 
 # ----------------------------------------------------------
-# 8.  HTTP ROUTE HANDLERS
-#     Grouped by functional area
+# 9.4  PER-CONNECTION TASKS
+#      asyncio.start_server() spawns one handle_client() per
+#      accepted socket, so a slow peer only stalls itself.
+#      Connections are kept alive (HTTP/1.1) and pipelined
+#      requests are answered in order.
 # ----------------------------------------------------------
-async def serve() -> None:
-    """Main async HTTP server loop."""
-    s = socket.socket()
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    ai = socket.getaddrinfo("0.0.0.0", PORT)[0][-1]
-    s.bind(ai)
-    s.listen(5)
-    s.setblocking(False)
-    log(f"HTTP listening on port {PORT}")
-
-    poller = select.poll()
-    poller.register(s, select.POLLIN)
-
+ACTIVE_CONN = 0                 # connections currently being served
+IDLE_CONN   = []                # writers of kept-alive connections awaiting a request, oldest first
+SLOT_EVENT  = asyncio.Event()   # set when a connection ends or goes idle (wait_slot)
+BAD_REQUEST = (b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n"
+               b"Connection: close\r\n\r\n")
+
+
+async def _refuse_malformed(w) -> None:
+    try:
+        w.write(BAD_REQUEST)
+        await drain(w)
+    except Exception:
+        pass
+
+
+async def read_request(r, w, timeout: float, idle: bool = False):
+    """Parse request line & headers; None when the peer sent nothing in time.
+
+    A request that can't be framed (bad request line, Content-Length) is
+    answered with a 400 here, and None closes the connection.
+    """
+    if idle:
+        IDLE_CONN.append(w)
+        SLOT_EVENT.set()
+    try:
+        line = await asyncio.wait_for(r.readline(), timeout)
+    except Exception:                       # timeout, reset or evicted – close quietly
+        line = b""
+    if idle and w in IDLE_CONN:
+        IDLE_CONN.remove(w)
+    t0, nbytes = time.ticks_us(), len(line)
+    if not line.strip():
+        return None
+    try:
+        parts = line.decode().strip().split(" ")
+    except ValueError:                      # not UTF-8 (UnicodeError)
+        parts = ()
+    if len(parts) != 3 or not parts[1].startswith("/"):
+        await _refuse_malformed(w)
+        return None
+    method, full_path, version = parts
+
+    headers = {}
     while True:
-        if poller.poll(100):
-            try:
-                cl, addr = s.accept()
-                cl.setblocking(True)
-
-                # ---- Parse request line & headers ----
-                req_line = cl.readline().decode().strip()
-                if not req_line:
-                    cl.close(); continue
-                method, full_path, _ = req_line.split(" ", 2)
-                clean_path = full_path.split('?')[0]
-                if clean_path == "/":
-                    clean_path = "/index.html"
-
-                content_len = 0
-                while True:
-                    line = cl.readline()
-                    if not line or line == b"\r\n":
-                        break
-                    if line.lower().startswith(b"content-length:"):
-                        content_len = int(line.split(b":", 1)[1].decode().strip())
-
-                body = b''
-                while len(body) < content_len:
-                    part = cl.recv(content_len - len(body))
-                    if not part:
-                        break
-                    body += part
-
-                # ============================================================
-                # 8.1  FILE-MANAGER API
-                # ============================================================
-                if clean_path == "/api/list":
-                    # GET – list all files (name, size, restricted flag)
-                    files = [{"name": f, "size": os.stat(f)[6],
-                              "restricted": f in RESTRICTED}
-                             for f in os.listdir()]
-                    send(cl, json.dumps(files), "application/json")
-
-                elif clean_path.startswith("/api/read/"):
-                    # GET – return raw file content (403 for restricted)
-                    name = clean_path[10:]
-                    if name in RESTRICTED:
-                        send(cl, "", code=403)
-                    else:
-                        try:
-                            with open(name) as f:
-                                send(cl, f.read(), "text/plain")
-                        except OSError:
-                            send(cl, "", code=404)
-
-                elif clean_path.startswith("/api/write/"):
-                    # POST – overwrite file with body (403 for restricted)
-                    name = clean_path[len("/api/write/"):]
-                    if name in RESTRICTED:
-                        send(cl, "", code=403)
-                    else:
-                        try:
-                            with open(name, "w") as f:
-                                f.write(body.decode())
-                            send(cl, "OK")
-                        except OSError as e:
-                            send(cl, f"Write failed: {e}", code=500)
-
-                elif clean_path.startswith("/api/upload/"):
-                    # POST (chunked) – append data at offset
-                    await handle_upload(cl, full_path, body)
-
-                elif clean_path.startswith("/api/download/"):
-                    # GET – force download with Content-Disposition
-                    name = clean_path[14:]
-                    if name in RESTRICTED:
-                        send(cl, "", code=403)
-                    else:
-                        try:
-                            st = os.stat(name)
-                            size = st[6]
-                            cl.send(f"HTTP/1.1 200 OK\r\n"
-                                    f"Content-Type: application/octet-stream\r\n"
-                                    f"Content-Disposition: attachment; filename=\"{name}\"\r\n"
-                                    f"Content-Length: {size}\r\n\r\n".encode())
-                            with open(name, "rb") as f:
-                                while True:
-                                    chunk = f.read(CHUNK)
-                                    if not chunk:
-                                        break
-                                    await send_all(cl, chunk)
-                        except OSError:
-                            send(cl, "", code=404)
-
-                elif clean_path.startswith("/api/delete/"):
-                    # POST – delete file (403 for restricted)
-                    name = clean_path[12:]
-                    if name in RESTRICTED:
-                        send(cl, "", code=403)
-                    else:
-                        try:
-                            os.remove(name)
-                            send(cl, "OK")
-                        except OSError:
-                            send(cl, "", code=404)
-
-                # ============================================================
-                # 8.2  CHAT API
-                # ============================================================
-                elif clean_path == "/api/chat/history":
-                    # GET – entire chat history
-                    send(cl, json.dumps(CHAT_HISTORY), "application/json")
-
-                elif clean_path == "/api/chat/poll":
-                    # GET – only messages newer than ?after=<id>
-                    qs = full_path.split('?')[1] if '?' in full_path else ''
-                    params = {kv.split('=')[0]: kv.split('=')[1]
-                              for kv in qs.split('&') if kv}
-                    after = int(params.get('after', 0))
-                    newer = [m for m in CHAT_HISTORY if m['id'] > after]
-                    send(cl, json.dumps(newer if newer else None), "application/json")
-
-                elif clean_path == "/api/chat/send":
-                    # POST – {name:"", message:""}
-                    try:
-                        payload = json.loads(body)
-                        chat_add(payload['name'], payload['message'])
-                        send(cl, "OK")
-                    except Exception as e:
-                        send(cl, str(e), code=400)
-
-                # ============================================================
-                # 8.3  SYSTEM & WIFI CONFIG API
-                # ============================================================
-                elif clean_path == "/api/info":
-                    # GET – system statistics
-                    import sys               # <-- new
-                    sta = network.WLAN(network.STA_IF)
-                    ap  = network.WLAN(network.AP_IF)
-                    temp = 27 - (ADC(4).read_u16() * 3.3 / 65535 - 0.706) / 0.001721
-                    info = {
-                        "mem_used":  gc.mem_alloc(),
-                        "mem_free":  gc.mem_free(),
-                        "fs_free":   os.statvfs("/")[0] * os.statvfs("/")[3],
-                        "fs_used":   os.statvfs("/")[0] * os.statvfs("/")[2] -
-                                     os.statvfs("/")[3] * os.statvfs("/")[0],
-                        "fs_total":  os.statvfs("/")[0] * os.statvfs("/")[2],
-                        "ssid": sta.config("ssid") if sta.isconnected() else None,
-                        "ip_sta":    sta.ifconfig()[0] if sta.isconnected() else None,
-                        "ip_ap":     ap.ifconfig()[0]  if ap.active()   else None,
-                        "gateway":   sta.ifconfig()[2] if sta.isconnected() else None,
-                        "rssi":      sta.status("rssi") if sta.isconnected() else 0,
-                        "cpu_temp":  round(temp, 1),
-                        "mode":      CFG.get("mode", "AP"),
-                        "fw_build":  os.uname().version.split()[0],   # Pico W Firmware Version
-                        "pwd_version": PICOWDESK_VERSION              # PicoWDesk Version
-                    }
-                    send(cl, json.dumps(info), "application/json")
-                
-                elif clean_path == "/api/scan":
-                    # GET – Wi-Fi scan results
-                    sta = network.WLAN(network.STA_IF)
-                    sta.active(True)
-                    nets = sta.scan()
-                    visible = [n for n in nets if n[0] and len(n[0].strip()) > 0]
-                    visible.sort(key=lambda n: n[3], reverse=True)   # strongest first
-                    send(cl, json.dumps(
-                        [{"ssid": n[0].decode(), "rssi": n[3]} for n in visible]),
-                        "application/json")
-
-                elif clean_path == "/api/connect":
-                    # POST – {ssid:"", psk:""}  → reboot into STA
-                    d = json.loads(body)
-                    CFG["ssid"] = d["ssid"]
-                    CFG["psk"]  = d["psk"]
-                    CFG["mode"] = "STA"
-                    with open("config.json", "w") as f:
-                        json.dump(CFG, f)
-                    send(cl, "OK")
-                    asyncio.create_task(reboot_later())
-
-                elif clean_path == "/api/mode/ap":
-                    # POST – force AP mode → reboot
-                    CFG["mode"] = "AP"
-                    with open("config.json", "w") as f:
-                        json.dump(CFG, f)
-                    send(cl, "OK")
-                    asyncio.create_task(reboot_later())
-
-                elif clean_path == "/api/mode/sta":
-                    # POST – force STA mode → reboot
-                    CFG["mode"] = "STA"
-                    with open("config.json", "w") as f:
-                        json.dump(CFG, f)
-                    send(cl, "OK")
-                    asyncio.create_task(reboot_later())
-
-                elif clean_path == "/api/restart":
-                    # POST – reboot device
-                    send(cl, "OK")
-                    asyncio.create_task(reboot_later())
-
-                # ============================================================
-                # 8.4  STATIC FILE SERVING (fallback)
-                # ============================================================
-                else:
-                    try:
-                        stat = os.stat(clean_path[1:])
-                        size = stat[6]
-                        with open(clean_path[1:], "rb") as f:
-                            mime = ("image/x-icon" if clean_path.endswith(".ico") else
-                                    "text/html"    if clean_path.endswith(".html") else
-                                    "text/plain")
-                            max_age = 3600 if mime == "image/x-icon" else 1
-                            cl.send(f"HTTP/1.1 200 OK\r\n"
-                                    f"Content-Type: {mime}\r\n"
-                                    f"Cache-Control: max-age={max_age}\r\n"
-                                    f"Content-Length: {size}\r\n\r\n".encode())
-                            remaining = size
-                            while remaining > 0:
-                                chunk = f.read(min(512, remaining))
-                                if not chunk:
-                                    break
-                                bytes_sent = cl.send(chunk)
-                                remaining -= bytes_sent
-                                await asyncio.sleep_ms(1)
-                    except OSError:
-                        cl.send(b"HTTP/1.1 404 Not Found\r\n\r\n")
-
-                cl.close()
-                log(f"Served {clean_path}")
-            except Exception as e:
-                log(f"Handler: {e}")
+        line = await asyncio.wait_for(r.readline(), READ_TIMEOUT)
+        nbytes += len(line)
+        if not line or line == b"\r\n":
+            break
+        try:
+            key, _, value = line.decode().partition(":")
+        except ValueError:
+            await _refuse_malformed(w)
+            return None
+        headers[key.strip().lower()] = value.strip()
+    try:
+        req = Request(r, w, method, full_path, version, headers)
+        if req.remaining < 0:
+            raise ValueError
+    except ValueError:                      # Content-Length not a number
+        await _refuse_malformed(w)
+        return None
+    req.parse_us = time.ticks_diff(time.ticks_us(), t0)
+    req.bytes_in = nbytes + req.remaining
+    return req
+
+
+# ---- Admission control: shed load with a fast 503/429 before it costs heap ----
+LOW_PRIORITY = ("/api/chat/", "/api/scan")   # parked or CPU-heavy; UI and static files go first
+INFLIGHT     = 0                # requests inside handle_request()
+RATE_BUCKETS = {}               # client IP → [tokens, ticks_ms of last refill]
+MAX_BUCKETS  = 16               # clients tracked; the least recently seen is forgotten
+CONN_REFUSED = (f"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n"
+                f"Retry-After: {RETRY_AFTER}\r\nConnection: close\r\n\r\n").encode()
+
+
+def _take_token(ip: str) -> int:
+    """Spend one of *ip*'s tokens; 0 if it had one, else seconds until it will."""
+    now = time.ticks_ms()
+    b = RATE_BUCKETS.get(ip)
+    if b is None:
+        if len(RATE_BUCKETS) >= MAX_BUCKETS:
+            del RATE_BUCKETS[min(RATE_BUCKETS, key=lambda k: RATE_BUCKETS[k][1])]
+        b = RATE_BUCKETS[ip] = [RATE_BURST, now]
+    else:
+        b[0] = min(RATE_BURST, b[0] + time.ticks_diff(now, b[1]) * RATE_LIMIT / 1000)
+        b[1] = now
+    if b[0] < 1:
+        return int((1 - b[0]) / RATE_LIMIT) + 1
+    b[0] -= 1
+    return 0
+
+
+def admit(req: Request) -> tuple:
+    """(0, 0) to serve *req*, else (503 or 429, Retry-After seconds).
+
+    Low-priority requests give up one MAX_REQUESTS slot and half of the
+    heap headroom to UI/static traffic, so they are shed first.
+    """
+    low = starts_any(req.clean_path, LOW_PRIORITY)
+    if INFLIGHT >= MAX_REQUESTS - (1 if low else 0):
+        return 503, RETRY_AFTER
+    floor = HEAP_LOW_WATER * 2 if low else HEAP_LOW_WATER
+    if gc.mem_free() < floor:
+        gc.collect()
+        if gc.mem_free() < floor:
+            return 503, RETRY_AFTER
+    if RATE_LIMIT:
+        try:
+            wait = _take_token(req.w.get_extra_info("peername")[0])
+        except Exception:                       # no peer address: don't limit
+            wait = 0
+        if wait:
+            return 429, wait
+    return 0, 0
+
+
+async def send_busy(req: Request, code: int = 503, retry: int = RETRY_AFTER) -> None:
+    """Refuse a request cheaply: empty body, Retry-After, connection closed on 503."""
+    if code == 503:
+        req.keep_alive = False
+    send_head(req, code, "text/plain", 0, f"Retry-After: {retry}\r\n")
+    await drain(req.w)
+
+
+async def wait_slot() -> bool:
+    """Make room for a new connection; False if none came free in CONN_WAIT_MS.
+
+    A connection that just answered counts until its task is back in
+    read_request(), so a client reconnecting right away waits for that
+    rather than getting a 503.
+    """
+    t0 = time.ticks_ms()
+    while ACTIVE_CONN >= MAX_CONN:
+        if IDLE_CONN:
+            # Reclaim the slot of the oldest idle keep-alive connection;
+            # its task notices the closed stream and exits on its own.
+            await close_stream(IDLE_CONN.pop(0))
+            return True
+        if release_parked():
+            return True                         # a parked chat client answers and leaves
+        left = CONN_WAIT_MS - time.ticks_diff(time.ticks_ms(), t0)
+        if left <= 0:
+            return False
+        SLOT_EVENT.clear()
+        try:
+            await asyncio.wait_for_ms(SLOT_EVENT.wait(), left)
+        except asyncio.TimeoutError:
+            pass
+    return True
+
+
+async def handle_client(r, w) -> None:
+    """Serve requests from one connection until it closes or hits a limit."""
+    global ACTIVE_CONN, REQ_COUNT, STATS_REJECTED, INFLIGHT
+    if not await wait_slot():
+        try:
+            w.write(CONN_REFUSED)
+            await drain(w)
+        except Exception:
+            pass
+        STATS_REJECTED += 1
+        await close_stream(w)
+        return
+
+    ACTIVE_CONN += 1
+    req = None
+    try:
+        for n in range(KEEPALIVE_MAX):
+            req = None
+            req = await read_request(r, w, KEEPALIVE_TIMEOUT if n else IDLE_TIMEOUT,
+                                     idle=n > 0)
+            if req is None:
+                break
+            if n == KEEPALIVE_MAX - 1:
+                req.keep_alive = False
+
+            t0, mem = time.ticks_us(), gc.mem_free()
+            code, retry = admit(req)
+            if code:
+                req.route = "shed"
+                await send_busy(req, code, retry)
+            else:
+                INFLIGHT += 1
                 try:
-                    cl.close()
-                except:
+                    await handle_request(req)
+                finally:
+                    INFLIGHT -= 1
+            REQ_COUNT += 1
+            if req.remaining:
+                await discard_body(req)
+            await drain(w)
+            request_done(req, t0, mem)
+            log(f"Served {req.clean_path} {req.status}", "debug")
+            if not req.keep_alive:
+                break
+    except Exception as e:
+        log(f"Handler: {repr(e)}", "error")
+        if req is not None:
+            if not req.sent:
+                try:
+                    req.keep_alive = False
+                    if isinstance(e, MemoryError):
+                        gc.collect()
+                        await send_busy(req)            # transient: ask to retry, don't reset
+                    else:
+                        await send(req, "Internal error", code=500)
+                except Exception:
                     pass
-        await asyncio.sleep_ms(20)
+            request_done(req, t0, mem)
+    finally:
+        ACTIVE_CONN -= 1
+        SLOT_EVENT.set()
+        await close_stream(w)
+
+
+async def serve() -> None:
+    """Start the asyncio HTTP server; runs until the server is closed."""
+    server = await asyncio.start_server(handle_client, "0.0.0.0", PORT,
+                                        backlog=MAX_CONN)
+    log(f"HTTP listening on port {PORT} (max {MAX_CONN} clients)")
+    boot_mark("listening")
+    await server.wait_closed()
 
 
 # ----------------------------------------------------------
-# 9.  REBOOT UTILITIES
+# 10.  REBOOT UTILITIES
 # ----------------------------------------------------------
 async def reboot_later() -> None:
-    """Wait 1 s then reboot (used after config changes)."""
+    """Wait 1 s then reboot (used after config changes); queued writes go first."""
     await asyncio.sleep(1)
+    try:
+        wb_drain()
+    except Exception as e:                  # flash full: the reboot was promised anyway
+        log(f"Write-behind before reset: {repr(e)}", "error")
     machine.reset()
 
 
 # ----------------------------------------------------------
-# 10.  BOOT SEQUENCE
+# 11.  BOOT SEQUENCE
 # ----------------------------------------------------------
+def load_modules() -> None:
+    """Stub out the feature modules, import the preloaded ones and API_MODULES.
+
+    Disabled modules get stubs too, which answer 404 for any method (rather
+    than falling through to the GET-only static files).
+    """
+    for mod in FEATURES:
+        install_stubs(mod)
+    for mod in CFG["PRELOAD_MODULES"]:
+        if mod in FEATURES and mod not in CFG["DISABLED_MODULES"]:
+            load_feature(mod)
+    for name in CFG["API_MODULES"]:
+        try:
+            __import__(name).setup(core())
+            log(f"API module loaded: {name}")
+        except Exception as e:
+            log(f"API module {name}: {repr(e)}", "error")
+
+
 async def main() -> None:
     log("=== PicoWDesk boot ===")
+    boot_mark("globals")
     asyncio.create_task(led_task())
+    build_index()
+    boot_mark("index")
+    load_modules()
+    boot_mark("modules")
     set_led_state("connecting")
-    # ----------  ALWAYS start from what config.json says  ----------
-    boot_mode = CFG.get("mode", "AP").strip().upper()
-    log(f"Boot mode requested: {boot_mode}")
-
-    if boot_mode == "STA":
-        ssid = CFG.get("ssid", "").strip()
-        if ssid:
-            if connect_sta():
-                CFG["mode"] = "STA"          # ensure persistence
-                log("STA success")
-                set_led_state("connected")
-            else:
-                log("STA failed → falling back to AP")
-                CFG["mode"] = "AP"           # force AP for next boot
-                with open("config.json", "w") as f:
-                    json.dump(CFG, f)
-                set_led_state("ap")
-        else:
-            log("No SSID → forcing AP")
-            CFG["mode"] = "AP"
-            with open("config.json", "w") as f:
-                json.dump(CFG, f)
-            set_led_state("ap")
-    else:
-        # Explicit AP
-        log("AP mode requested")
-        set_led_state("ap")
-
-    # ----------  Bring up the interface that has been decided  ----------
-    if CFG["mode"] == "AP":
-        start_ap()
-        log("Running in AP mode")
-    else:
-        log("Running in STA mode")
-
+    asyncio.create_task(wifi_task())      # serve() listens while Wi-Fi comes up
     await serve()
 
 
@@ -1,9 +1,11 @@
 #!/usr/bin/env bash
 # PicoWDesk – Base Installation
 # Minimal desktop only (no apps).
+# Usage: ./package-base.sh [--gzip|--gzip-only]   (see package-gzip.sh)
 
 set -e
 DEPLOY_DIR="deploy"
+GZIP_OPT="${1:-}"
 
 echo "🧹 Clearing $DEPLOY_DIR…"
 rm -rf "$DEPLOY_DIR"
@@ -11,6 +13,7 @@ mkdir -p "$DEPLOY_DIR"
 
 echo "📦 Copying base files…"
 cp main.py "$DEPLOY_DIR/"
+cp pwd_*.py "$DEPLOY_DIR/"              # feature modules, imported on first use
 cp index.html "$DEPLOY_DIR/"
 cp config.json "$DEPLOY_DIR/"
 cp favicon.ico "$DEPLOY_DIR/"
@@ -18,4 +21,7 @@ cp favicon.ico "$DEPLOY_DIR/"
 echo "📄 Adding generic installation guide…"
 cp docs/INSTALL.md "$DEPLOY_DIR/"
 
+bash package-bundle.sh "$DEPLOY_DIR"
+bash package-gzip.sh "$DEPLOY_DIR" "$GZIP_OPT"
+
 echo "✅ Base package ready in $DEPLOY_DIR"
\ No newline at end of file
@@ -0,0 +1,36 @@
+#!/usr/bin/env bash
+# PicoWDesk – prebuilt desktop bundle for a deploy folder
+# Called by the package-*.sh scripts before package-gzip.sh.
+# Writes bundle.json.gz: the app list plus every .ico (base64), i.e. the
+# same JSON pwd_bundle.py streams from /api/bundle, but gzip-compressed.
+# main.py deletes it as soon as an app or icon changes on the Pico and
+# pwd_bundle.py writes a new one once the changes stop (BUNDLE_REBUILD_MS).
+# The gzip MTIME field carries a CRC of the apps' and icons' names and
+# sizes (bundle_set_crc in pwd_bundle.py): the file is dropped when that
+# module loads if apps were added or removed after packaging, e.g. with mpremote.
+
+set -e
+DEPLOY_DIR="$1"
+
+echo "🧩 Building desktop bundle…"
+python3 - "$DEPLOY_DIR" <<'PY'
+import base64, gzip, json, os, sys, zlib
+
+d = sys.argv[1]
+restricted = set(json.load(open(os.path.join(d, "config.json"))).get(
+    "RESTRICTED", ["main.py", "config.json", "index.html"]))
+names = sorted(os.listdir(d))
+files = [{"name": n, "size": os.path.getsize(os.path.join(d, n)), "restricted": n in restricted}
+         for n in names if n.endswith(".html") and n != "index.html"]
+icons = {n: base64.b64encode(open(os.path.join(d, n), "rb").read()).decode()
+         for n in names if n.endswith(".ico")}
+crc = 0
+for n in names:
+    if (n.endswith(".html") and n != "index.html") or n.endswith(".ico"):
+        crc = zlib.crc32(f"{n}:{os.path.getsize(os.path.join(d, n))};".encode(), crc)
+data = json.dumps({"gen": "%08x" % crc, "files": files, "icons": icons}).encode()
+with open(os.path.join(d, "bundle.json.gz"), "wb") as f:
+    f.write(gzip.compress(data, 9, mtime=crc))
+print(f"   {len(files)} apps, {len(icons)} icons, {len(data)} → "
+      f"{os.path.getsize(os.path.join(d, 'bundle.json.gz'))} bytes")
+PY
@@ -1,9 +1,11 @@
 #!/usr/bin/env bash
 # PicoWDesk – Games Installation
 # System + games only; all games prefixed _Games_.
+# Usage: ./package-games.sh [--gzip|--gzip-only]   (see package-gzip.sh)
 
 set -e
 DEPLOY_DIR="deploy"
+GZIP_OPT="${1:-}"
 SYS_SRC="apps/system"
 GAMES_SRC="apps/games"
 
@@ -13,6 +15,7 @@ mkdir -p "$DEPLOY_DIR"
 
 echo "📦 Copying base files…"
 cp main.py "$DEPLOY_DIR/"
+cp pwd_*.py "$DEPLOY_DIR/"              # feature modules, imported on first use
 cp index.html "$DEPLOY_DIR/"
 cp config.json "$DEPLOY_DIR/"
 cp favicon.ico "$DEPLOY_DIR/"
@@ -49,4 +52,7 @@ cp "$GAMES_SRC"/*.ico "$DEPLOY_DIR/" 2>/dev/null || true
 echo "📄 Adding generic installation guide…"
 cp docs/INSTALL.md "$DEPLOY_DIR/"
 
+bash package-bundle.sh "$DEPLOY_DIR"
+bash package-gzip.sh "$DEPLOY_DIR" "$GZIP_OPT"
+
 echo "✅ Games package ready in $DEPLOY_DIR"
\ No newline at end of file
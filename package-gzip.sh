@@ -0,0 +1,32 @@
+#!/usr/bin/env bash
+# PicoWDesk – gzip post-processing for a deploy folder
+# Called by the package-*.sh scripts with their first argument:
+#   --gzip       add <file>.gz next to each asset (smaller transfers)
+#   --gzip-only  replace each asset by <file>.gz   (smaller transfers + more flash)
+# main.py serves the .gz with Content-Encoding: gzip to browsers that accept it.
+
+set -e
+DEPLOY_DIR="$1"
+GZIP_MODE="$2"
+GZ_TYPES="html ico css js svg"     # keep in sync with GZ_TYPES in main.py
+
+case "$GZIP_MODE" in
+    "") exit 0 ;;
+    --gzip|--gzip-only) ;;
+    *) echo "❌ Unknown option $GZIP_MODE (use --gzip or --gzip-only)"; exit 1 ;;
+esac
+
+echo "🗜️  Compressing assets ($GZIP_MODE)…"
+for ext in $GZ_TYPES; do
+    for f in "$DEPLOY_DIR"/*."$ext"; do
+        [ -e "$f" ] || continue
+        gzip -9 -n -c "$f" > "$f.gz"          # -n: no name/timestamp → reproducible
+        if [ "$(wc -c < "$f.gz")" -ge "$(wc -c < "$f")" ]; then
+            rm "$f.gz"                         # not worth it, keep raw only
+            continue
+        fi
+        if [ "$GZIP_MODE" = "--gzip-only" ]; then
+            rm "$f"
+        fi
+    done
+done
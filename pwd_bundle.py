@@ -0,0 +1,240 @@
+# ----------------------------------------------------------
+#  PicoWDesk – desktop bundle feature module
+#  https://github.com/RyanBruins/PicoWDesk
+#  Licence: MIT
+#
+#  pwd_bundle.py
+#  -------------
+#  /api/bundle: the app list + every icon in one response.
+#  bundle.json.gz is prebuilt by package-bundle.sh; when an app
+#  or icon changes main.py deletes it (never served stale, see
+#  bundle_changed) and bundle_builder() writes a new one once the
+#  changes stop. Meanwhile the bundle is streamed live.
+#  Its gzip MTIME field holds bundle_set_crc() of the set it was
+#  built from, so apps copied with mpremote while the server was
+#  down are noticed when this module loads. Imported by main.py
+#  on the first /api/bundle request (see FEATURES in main.py).
+# ----------------------------------------------------------
+import binascii
+import json
+import os
+import uasyncio as asyncio
+
+S = None                        # the server core (main.py), bound by setup()
+BUNDLE_TAG = None               # ETag of the current app/icon set; None = recompute
+BUNDLE_EVENT = asyncio.Event()  # set → bundle_builder() rebuilds S.BUNDLE
+BUILDER = None                  # bundle_builder() task
+BUNDLE_MAX_AGE = BUNDLE_REBUILD_MS = 0   # from config.json
+
+
+def _is_app_or_icon(name: str) -> bool:
+    return S.ends_any(name, (".html", ".ico")) and name != "index.html"
+
+
+def bundle_tag() -> str:
+    """CRC of every app's and icon's name, size and mtime – stable across reboots."""
+    global BUNDLE_TAG
+    if BUNDLE_TAG is None:
+        crc = 0
+        for name in sorted(S.FILE_INDEX):
+            if _is_app_or_icon(name):
+                try:
+                    st = os.stat(name)
+                except OSError:
+                    st = os.stat(name + ".gz")
+                crc = binascii.crc32(f"{name}:{st[6]}:{st[8]};".encode(), crc)
+        BUNDLE_TAG = "%08x" % crc
+    return BUNDLE_TAG
+
+
+def bundle_set_crc() -> int:
+    """CRC of every app's and icon's name and size (index only; same in package-bundle.sh)."""
+    crc = 0
+    for name in sorted(S.FILE_INDEX):
+        if _is_app_or_icon(name):
+            crc = binascii.crc32(f"{name}:{S.FILE_INDEX[name]['size']};".encode(), crc)
+    return crc
+
+
+def changed() -> None:
+    """Called by main.py's bundle_changed(): new ETag, rebuild once things settle."""
+    global BUNDLE_TAG
+    BUNDLE_TAG = None
+    if S.deflate and BUNDLE_REBUILD_MS:
+        BUNDLE_EVENT.set()
+
+
+def bundle_check() -> None:
+    """On load: drop a BUNDLE built for another app/icon set (see bundle_set_crc)."""
+    try:
+        with open(S.BUNDLE, "rb") as f:
+            stamp = f.read(8)[4:]
+    except OSError:
+        changed()                           # none yet (or lost to a reset): build one
+        return
+    if int.from_bytes(stamp, "little") != bundle_set_crc():
+        S.log("Bundle: apps changed offline, rebuilding", "warn")
+        changed()
+        S.bundle_changed()
+
+
+def _read_full(f, mv) -> int:
+    """readinto() until *mv* is full or EOF (inflating streams return short reads)."""
+    got = 0
+    while got < len(mv):
+        n = f.readinto(mv[got:])
+        if not n:
+            break
+        got += n
+    return got
+
+
+def bundle_plan() -> tuple:
+    """(head, [(label, stored path, inflate?, size)], length) of the bundle JSON."""
+    apps = [e for e in S.FILE_INDEX.values()
+            if e["name"].endswith(".html") and e["name"] != "index.html"]
+    head = (json.dumps({"gen": bundle_tag(), "files": apps})[:-1] + ', "icons": {').encode()
+    length = len(head) + 2                  # + '}}'
+    icons = []
+    for e in S.FILE_INDEX.values():
+        name = e["name"]
+        if name.endswith(".ico"):
+            try:
+                os.stat(name)
+                path = name
+            except OSError:
+                if not S.deflate:
+                    continue
+                path = name + ".gz"         # gzip-only icon: inflate on the fly
+            label = f'{", " if icons else ""}"{name}": "'.encode()
+            icons.append((label, path, path != name, e["size"]))
+            length += len(label) + 4 * ((e["size"] + 2) // 3) + 1
+    return head, icons, length
+
+
+async def write_bundle(w, head: bytes, icons: list, drain) -> None:
+    """Write the bundle JSON to stream *w*, base64-encoding icons block by block
+    straight from flash; awaits *drain*() after every block.
+
+    Each icon is sent at its planned size, so Content-Length holds while
+    one changes underneath; one that shrank raises OSError (connection dropped).
+    """
+    deflate = S.deflate
+    w.write(head)
+    item = S._get_io_buf()
+    mv = item[1][:(S.CHUNK // 3) * 3]       # whole base64 quanta per block
+    try:
+        for label, path, inflate, size in icons:
+            w.write(label)
+            f = open(path, "rb")
+            if inflate:
+                f = deflate.DeflateIO(f, deflate.GZIP, 0, True)
+            with f:
+                while size:
+                    n = _read_full(f, mv if size >= len(mv) else mv[:size])
+                    if not n:
+                        raise OSError("short read")
+                    w.write(binascii.b2a_base64(mv[:n], newline=False))
+                    size -= n
+                    await drain()
+            w.write(b'"')
+    finally:
+        S.BUF_POOL.append(item)
+    w.write(b"}}")
+
+
+async def send_bundle(req, headers: str) -> None:
+    """Stream {"gen", "files": [.html entries], "icons": {"x.ico": "<base64>"}} live.
+
+    The response never sits in RAM; its Content-Length is known up front.
+    """
+    head, icons, length = bundle_plan()
+    S.send_head(req, 200, "application/json", length, headers)
+    await write_bundle(req.w, head, icons, lambda: S.drain(req.w))
+    await S.drain(req.w)
+
+
+async def bundle_builder() -> None:
+    """Background task: gzip a new S.BUNDLE once apps/icons stopped changing."""
+    deflate = S.deflate
+    tmp = S.BUNDLE + ".tmp"
+    while True:
+        await BUNDLE_EVENT.wait()
+        BUNDLE_EVENT.clear()
+        await asyncio.sleep_ms(BUNDLE_REBUILD_MS)
+        if BUNDLE_EVENT.is_set():
+            continue                        # still changing
+        try:
+            S.wb_drain()
+            head, icons, _ = bundle_plan()
+            with open(tmp, "wb") as f:
+                z = deflate.DeflateIO(f, deflate.GZIP, 10)   # 1 KB window
+                await write_bundle(z, head, icons, lambda: asyncio.sleep_ms(0))
+                z.close()
+            with open(tmp, "r+b") as f:
+                f.seek(4)                   # gzip MTIME: the set this was built from
+                f.write(bundle_set_crc().to_bytes(4, "little"))
+            if BUNDLE_EVENT.is_set():
+                os.remove(tmp)              # changed while building: next round
+                continue
+            os.rename(tmp, S.BUNDLE)
+            S.touch(S.BUNDLE)
+            S.log("Bundle rebuilt", "debug")
+        except Exception as e:              # no compressor in this firmware, flash full
+            S.log(f"Bundle: {repr(e)}", "warn")
+            _remove_tmp()
+
+
+def _remove_tmp() -> None:
+    try:
+        os.remove(S.BUNDLE + ".tmp")
+    except OSError:
+        pass
+
+
+# ---- Route handler ----
+async def api_bundle(req) -> None:
+    """App list + all icons (base64) so the desktop paints from one request.
+
+    The ETag only changes with the apps and icons; browsers may reuse the
+    bundle for BUNDLE_MAX_AGE seconds without asking.
+    """
+    S.wb_drain()                            # sizes and dates of queued apps/icons
+    f = None
+    if "gzip" in req.headers.get("accept-encoding", ""):
+        try:
+            st = os.stat(S.BUNDLE)
+            f = open(S.BUNDLE, "rb")
+        except OSError:
+            pass
+    etag = f'"B{bundle_tag()}{"-gz" if f else ""}"'
+    headers = S.cache_headers(etag, None, BUNDLE_MAX_AGE) + "Vary: Accept-Encoding\r\n"
+    if S.is_fresh(req, etag, None):
+        if f:
+            f.close()
+        await S.send_not_modified(req, headers)
+        return
+    if f:
+        with f:
+            S.send_head(req, 200, "application/json", st[6],
+                        "Content-Encoding: gzip\r\n" + headers)
+            await S.send_file(req.w, f, st[6])
+        return
+    await send_bundle(req, headers)
+
+
+def setup(server) -> None:
+    """Bind the core, read config, check the prebuilt bundle, register the route."""
+    global S, BUILDER, BUNDLE_MAX_AGE, BUNDLE_REBUILD_MS
+    S = server
+    BUNDLE_MAX_AGE    = S.CFG["BUNDLE_MAX_AGE"]
+    BUNDLE_REBUILD_MS = S.CFG["BUNDLE_REBUILD_MS"]
+    S.route("/api/bundle")(api_bundle)
+    BUILDER = asyncio.create_task(bundle_builder())
+    bundle_check()
+
+
+def teardown() -> None:
+    """Stop the builder; a bundle it left half written is removed."""
+    BUILDER.cancel()
+    _remove_tmp()
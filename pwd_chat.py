@@ -0,0 +1,165 @@
+# ----------------------------------------------------------
+#  PicoWDesk – chat feature module
+#  https://github.com/RyanBruins/PicoWDesk
+#  Licence: MIT
+#
+#  pwd_chat.py
+#  -----------
+#  In-memory chat: /api/chat/history, /poll (long-poll),
+#  /stream (Server-Sent Events) and /send. Imported by main.py
+#  on the first chat request (see FEATURES in main.py).
+#
+#  Messages live in a fixed ring of pre-serialized JSON, slot
+#  id % MAX_CHAT_LEN. Readers wait on CHAT_EVENT, which chat_add()
+#  sets and replaces, so a parked client costs nothing until a
+#  message arrives.
+# ----------------------------------------------------------
+import json
+import uasyncio as asyncio
+
+S = None                        # the server core (main.py), bound by setup()
+MAX_CHAT_LEN = 50
+CHAT_RING    = [None] * MAX_CHAT_LEN   # '{"id":…,"name":…,"message":…}' strings
+CHAT_SEQ     = 0                       # id of the newest message
+CHAT_EVENT   = asyncio.Event()
+CHAT_WAITERS = []                      # requests parked in chat_wait(), oldest first
+CHAT_WAIT_MS = CHAT_MAX_WAITERS = 0    # from config.json
+
+
+def _chat_wake() -> None:
+    global CHAT_EVENT
+    ev, CHAT_EVENT = CHAT_EVENT, asyncio.Event()
+    ev.set()
+
+
+def chat_add(name: str, message: str) -> None:
+    """Store a new chat message in the ring and wake every waiting client."""
+    global CHAT_SEQ
+    CHAT_SEQ += 1
+    CHAT_RING[CHAT_SEQ % MAX_CHAT_LEN] = json.dumps({
+        "id": CHAT_SEQ,
+        "name": (name[:10] if len(name) > 10 else name),
+        "message": (message[:256] if len(message) > 256 else message)
+    })
+    _chat_wake()
+
+
+def chat_since(after: int) -> str:
+    """JSON array of the buffered messages with id > after."""
+    first = max(after, CHAT_SEQ - MAX_CHAT_LEN) + 1
+    return "[" + ",".join(CHAT_RING[i % MAX_CHAT_LEN]
+                          for i in range(first, CHAT_SEQ + 1)) + "]"
+
+
+async def chat_wait(req, after: int, timeout_ms: int):
+    """Park until a message newer than `after` exists: True when one does,
+    False on timeout, None when chat_kick() needed the connection back."""
+    CHAT_WAITERS.append(req)
+    try:
+        while CHAT_SEQ <= after:
+            if req not in CHAT_WAITERS:
+                return None
+            await asyncio.wait_for_ms(CHAT_EVENT.wait(), timeout_ms)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        if req in CHAT_WAITERS:
+            CHAT_WAITERS.remove(req)
+    return True
+
+
+def chat_kick() -> bool:
+    """Release the oldest parked chat client; its connection then closes.
+
+    Registered in main.py's RELEASERS, so handle_client() can take the
+    slot back when MAX_CONN is reached.
+    """
+    if not CHAT_WAITERS:
+        return False
+    req = CHAT_WAITERS.pop(0)
+    req.keep_alive = False
+    _chat_wake()
+    return True
+
+
+# ---- Route handlers ----
+async def api_chat_history(req) -> None:
+    """Entire chat history."""
+    await S.send(req, chat_since(0), "application/json")
+
+
+async def api_chat_poll(req) -> None:
+    """Only messages newer than ?after=<id>; null when there are none.
+
+    ?wait=<ms> long-polls: the reply is held until a message arrives,
+    unless CHAT_MAX_WAITERS are parked already (answered at once, so the
+    client backs off instead of releasing another waiter).
+    """
+    after = int(req.query.get('after', 0))
+    wait = min(int(req.query.get('wait', 0)), CHAT_WAIT_MS)
+    if CHAT_SEQ <= after and wait > 0 and len(CHAT_WAITERS) < CHAT_MAX_WAITERS:
+        await chat_wait(req, after, wait)
+    await S.send(req, chat_since(after) if CHAT_SEQ > after else "null",
+                 "application/json")
+
+
+async def api_chat_stream(req) -> None:
+    """Server-Sent Events: one "message" event per chat message,
+    resuming after the browser's Last-Event-ID (or ?after=<id>).
+
+    With CHAT_MAX_WAITERS parked already the stream is refused (503), which
+    makes Chat.html long-poll instead; a stream released by chat_kick() is
+    told to reconnect only after CHAT_WAIT_MS.
+    """
+    w = req.w
+    after = int(req.headers.get('last-event-id') or req.query.get('after') or 0)
+    if len(CHAT_WAITERS) >= CHAT_MAX_WAITERS:
+        await S.send_busy(req)
+        return
+    S.send_head(req, 200, "text/event-stream", None, "Cache-Control: no-cache\r\n")
+    w.write(b"retry: 2000\n\n")
+    try:
+        while True:
+            if CHAT_SEQ > after:
+                for i in range(max(after, CHAT_SEQ - MAX_CHAT_LEN) + 1, CHAT_SEQ + 1):
+                    w.write(f"id: {i}\ndata: {CHAT_RING[i % MAX_CHAT_LEN]}\n\n".encode())
+                after = CHAT_SEQ
+            else:
+                w.write(b": ping\n\n")           # lets a dead peer surface as a write error
+            await S.drain(w)
+            if await chat_wait(req, after, CHAT_WAIT_MS) is None:
+                w.write(f"retry: {CHAT_WAIT_MS}\n\n".encode())   # the slot was needed
+                await S.drain(w)
+                break
+    except OSError:
+        pass                                    # browser went away
+
+
+async def api_chat_send(req) -> None:
+    """{name:"", message:""}"""
+    try:
+        payload = json.loads(await S.read_body(req))
+        chat_add(payload['name'], payload['message'])
+        await S.send(req, "OK")
+    except (ValueError, KeyError, TypeError) as e:     # not {name, message}
+        await S.send(req, str(e), code=400)
+
+
+def setup(server) -> None:
+    """Bind the core, read config and register routes."""
+    global S, CHAT_WAIT_MS, CHAT_MAX_WAITERS
+    S = server
+    CHAT_WAIT_MS     = S.CFG["CHAT_WAIT_MS"]
+    CHAT_MAX_WAITERS = S.CFG["CHAT_MAX_WAITERS"]
+    S.route("/api/chat/history")(api_chat_history)
+    S.route("/api/chat/poll")(api_chat_poll)
+    S.route("/api/chat/stream")(api_chat_stream)
+    S.route("/api/chat/send", ("POST",))(api_chat_send)
+    S.RELEASERS.append(chat_kick)
+
+
+def teardown() -> None:
+    """Let every parked client go (unload drops the history)."""
+    S.RELEASERS.remove(chat_kick)
+    while chat_kick():
+        pass
@@ -0,0 +1,341 @@
+# ----------------------------------------------------------
+#  PicoWDesk – file API feature module
+#  https://github.com/RyanBruins/PicoWDesk
+#  Licence: MIT
+#
+#  pwd_files.py
+#  ------------
+#  /api/read, /api/write, /api/patch, /api/download,
+#  /api/delete, /api/rename, /api/copy and /api/batch.
+#  Imported by main.py on the first request to one of them
+#  (see FEATURES in main.py); S is main.py itself, W the
+#  write path (pwd_write.py).
+# ----------------------------------------------------------
+import json
+import os
+import uasyncio as asyncio
+import pwd_write as W           # body_to_file, write-behind, truncate_file
+
+S = None                        # the server core (main.py), bound by setup()
+
+
+# ---- File operations (single endpoints and /api/batch) ----
+#      Each returns the HTTP status code of its outcome.
+def op_delete(name: str) -> int:
+    """Delete a file and any .gz sibling."""
+    if S.is_restricted(name):
+        return 403
+    W.wb_drain(name)                    # nothing may land on it afterwards
+    try:
+        os.remove(name)
+    except OSError:
+        return 200 if S.drop_gz(name) else 404   # gzip-only file
+    S.touch(name)
+    S.drop_gz(name)
+    return 200
+
+
+async def op_write(name: str, data: bytes) -> int:
+    """Replace a file with a small in-memory payload (queued write-behind)."""
+    if S.is_restricted(name):
+        return 403
+    f = W.wb_open(name)
+    try:
+        await W.wb_put(name, f, data)
+    finally:
+        W.wb_close(f)
+    S.touch(name)
+    S.drop_gz(name)
+    return 200
+
+
+def _op_paths(src: str, dst: str):
+    """Stored (source, target) paths for rename/copy, or an error code.
+
+    A gzip-only source moves as '<src>.gz' → '<dst>.gz', which only makes
+    sense if *dst* is a compressible type as well.
+    """
+    if S.is_restricted(src) or S.is_restricted(dst):
+        return 403
+    if not src or not dst or src == dst:
+        return 400
+    if W.WB_QUEUE:                      # both names as they will be on flash
+        for name in (src, dst, src + ".gz", dst + ".gz"):
+            W.wb_drain(name)
+    try:
+        os.stat(src)
+        return src, dst
+    except OSError:
+        pass
+    if not S.ends_any(src, S.GZ_TYPES):
+        return 404
+    try:
+        os.stat(src + ".gz")
+    except OSError:
+        return 404
+    return (src + ".gz", dst + ".gz") if S.ends_any(dst, S.GZ_TYPES) else 400
+
+
+def _op_done(src_path: str, dst_path: str, dst: str) -> None:
+    """Drop whatever the new target could be shadowed by, update index/ETags."""
+    if dst_path == dst:
+        S.drop_gz(dst)
+    else:
+        try:
+            os.remove(dst)                  # raw copy would hide the new .gz
+            S.touch(dst)
+        except OSError:
+            pass
+    S.touch(dst_path)
+
+
+def op_rename(src: str, dst: str) -> int:
+    """Rename on flash (os.rename) – no data is copied."""
+    paths = _op_paths(src, dst)
+    if isinstance(paths, int):
+        return paths
+    os.rename(paths[0], paths[1])
+    if paths[0] == src:
+        S.drop_gz(src)                      # stale sibling of the old name
+    S.touch(paths[0])
+    _op_done(paths[0], paths[1], dst)
+    return 200
+
+
+async def op_copy(src: str, dst: str) -> int:
+    """Copy through a pooled buffer, yielding to other clients between blocks."""
+    paths = _op_paths(src, dst)
+    if isinstance(paths, int):
+        return paths
+    item = S._get_io_buf()
+    buf, mv = item[0], item[1]
+    try:
+        with open(paths[0], "rb") as fi, open(paths[1], "wb") as fo:
+            while True:
+                n = fi.readinto(buf)
+                if not n:
+                    break
+                fo.write(buf if n == S.CHUNK else mv[:n])
+                await asyncio.sleep_ms(0)
+    except OSError:
+        S.touch(paths[1])                   # list what is on flash: part of a copy, or none
+        raise
+    finally:
+        S.BUF_POOL.append(item)
+    _op_done(paths[0], paths[1], dst)
+    return 200
+
+
+# ---- Route handlers ----
+async def api_read(req, name: str) -> None:
+    """Return raw file content (403 for restricted)."""
+    if S.is_restricted(name):
+        await S.send(req, "", code=403)
+        return
+    try:
+        path, st, coding = S.pick_variant(req, name)
+        f, size, extra, etag, modified = S.open_variant(path, st, coding)
+    except OSError:
+        await S.send(req, "", code=404)
+        return
+    with f:
+        headers = extra + S.cache_headers(etag, modified)
+        if S.is_fresh(req, etag, modified):
+            await S.send_not_modified(req, headers)
+            return
+        S.send_head(req, 200, "text/plain", size, headers)
+        await S.send_file(req.w, f, size)
+
+
+async def _send_written(req, name: str, f=None) -> None:
+    """Close *f* (once its queued blocks are written) and answer 'OK'.
+
+    With ?sync=1, or no handle left open, the data is on flash first and
+    the file's new ETag comes along, so the client can If-Match its next patch.
+    """
+    if f is not None:
+        if "sync" not in req.query:
+            W.wb_close(f)
+            await S.send(req, "OK")
+            return
+        W.wb_drain(f=f)
+        f.close()
+    etag = S.file_validators(name, os.stat(name))[0]
+    S.send_head(req, 200, "text/plain", 2, f"ETag: {etag}\r\n")
+    req.w.write(b"OK")
+    await S.drain(req.w)
+
+
+async def api_write(req, name: str) -> None:
+    """Overwrite file with the body, queued write-behind (403 for restricted)."""
+    if S.is_restricted(name):
+        await S.send(req, "", code=403)
+        return
+    try:
+        f = W.wb_open(name)
+        try:
+            await W.wb_write(req, f, name)
+        except Exception:
+            W.wb_close(f)
+            raise
+        S.touch(name)
+        S.drop_gz(name)
+        await _send_written(req, name, f)
+    except OSError as e:
+        await S.send(req, f"Write failed: {e}", code=500)
+
+
+async def api_patch(req, name: str) -> None:
+    """Change part of an existing file in place, without rewriting the rest.
+
+    /api/patch/<file>?offset=N writes the body at N (at most the current
+    size), ?append at the end; &truncate=L then cuts the file to L bytes
+    (on its own, ?truncate=L only cuts).
+    If-Match: <ETag> refuses (412) a file changed since the client read it.
+    &sync=1 answers once the data is on flash, with the new ETag.
+    """
+    if S.is_restricted(name):
+        await S.send(req, "", code=403)
+        return
+    q = req.query
+    try:
+        W.wb_drain(name)
+        st = os.stat(name)
+    except OSError:
+        await S.send(req, "", code=404)
+        return
+    match = req.headers.get("if-match")
+    if match is not None and match != "*" and S.file_validators(name, st)[0] not in match:
+        await S.send(req, "", code=412)
+        return
+    size = st[6]
+    try:
+        if "append" in q or ("truncate" in q and "offset" not in q):
+            offset = size
+        else:
+            offset = int(q["offset"])
+        length = int(q["truncate"]) if "truncate" in q else None
+    except (KeyError, ValueError):
+        await S.send(req, "offset, append or truncate", code=400)
+        return
+    if not 0 <= offset <= size or (length is not None and length < 0):
+        await S.send(req, "", code=416)
+        return
+    try:
+        end = offset + req.remaining
+        f = W.wb_open(name, "r+b")                  # not "wb": that would truncate
+        try:
+            await W.wb_write(req, f, name, offset)
+        except Exception:
+            W.wb_close(f)
+            raise
+        if length is not None and length < max(size, end):
+            W.wb_drain(f=f)
+            f.close()
+            f = None
+            await W.truncate_file(name, length)
+        S.touch(name)
+        S.drop_gz(name)
+        await _send_written(req, name, f)
+    except OSError as e:
+        await S.send(req, f"Write failed: {e}", code=500)
+
+
+async def api_download(req, name: str) -> None:
+    """Force download with Content-Disposition; honours Range (resume, segments)."""
+    if S.is_restricted(name):
+        await S.send(req, "", code=403)
+        return
+    try:
+        path, st, coding = S.pick_variant(req, name)
+        f, size, extra, etag, modified = S.open_variant(path, st, coding)
+    except OSError:
+        await S.send(req, "", code=404)
+        return
+    with f:
+        headers = extra + S.cache_headers(etag, modified)
+        if S.is_fresh(req, etag, modified):
+            await S.send_not_modified(req, headers)
+            return
+        await S.send_file_ranged(req, f, size, "application/octet-stream",
+                                 headers + f"Content-Disposition: attachment; filename=\"{name}\"\r\n",
+                                 etag, modified, coding != "gunzip")
+
+
+async def api_delete(req, name: str) -> None:
+    """Delete file (403 for restricted)."""
+    code = op_delete(name)
+    await S.send(req, "OK" if code == 200 else "", code=code)
+
+
+async def api_rename(req, name: str) -> None:
+    """/api/rename/<src>?to=<dst>"""
+    try:
+        code = op_rename(name, S.clean_name(req.query.get("to", "")))
+    except OSError as e:
+        await S.send(req, f"Rename failed: {e}", code=500)
+        return
+    await S.send(req, "OK" if code == 200 else "", code=code)
+
+
+async def api_copy(req, name: str) -> None:
+    """/api/copy/<src>?to=<dst>"""
+    try:
+        code = await op_copy(name, S.clean_name(req.query.get("to", "")))
+    except OSError as e:
+        await S.send(req, f"Copy failed: {e}", code=500)
+        return
+    await S.send(req, "OK" if code == 200 else "", code=code)
+
+
+async def api_batch(req) -> None:
+    """Run file ops in order; answers {"results":[{"op":"delete","status":200}, …]}
+
+    {"ops":[{"op":"delete","name":"a"}, {"op":"rename","from":"a","to":"b"},
+            {"op":"copy","from":"a","to":"b"}, {"op":"write","name":"a","data":"…"}]}
+    """
+    try:
+        ops = json.loads(await S.read_body(req))["ops"]
+        if not isinstance(ops, list):
+            raise TypeError("ops is not a list")
+    except (ValueError, KeyError, TypeError) as e:
+        await S.send(req, str(e), code=400)
+        return
+    results = []
+    for op in ops:
+        kind = op.get("op") if isinstance(op, dict) else None
+        try:
+            if kind == "delete":
+                code = op_delete(S.clean_name(op["name"]))
+            elif kind == "rename":
+                code = op_rename(S.clean_name(op["from"]), S.clean_name(op["to"]))
+            elif kind == "copy":
+                code = await op_copy(S.clean_name(op["from"]), S.clean_name(op["to"]))
+            elif kind == "write" and isinstance(op.get("data", ""), str):
+                code = await op_write(S.clean_name(op["name"]), op.get("data", "").encode())
+            else:
+                code = 400
+        except (KeyError, AttributeError, TypeError):   # names that aren't strings
+            code = 400
+        except S.HTTPError as e:                        # clean_name()
+            code = e.code
+        except OSError:
+            code = 500
+        results.append({"op": kind, "status": code})
+    await S.send(req, json.dumps({"results": results}), "application/json")
+
+
+def setup(server) -> None:
+    """Bind the core and register this module's routes."""
+    global S
+    S = server
+    W.setup(server)
+    route = S.route
+    route("/api/read/", prefix=True)(api_read)
+    route("/api/write/", ("POST",), prefix=True)(api_write)
+    route("/api/patch/", ("POST",), prefix=True)(api_patch)
+    route("/api/download/", prefix=True)(api_download)
+    route("/api/delete/", ("POST",), prefix=True)(api_delete)
+    route("/api/rename/", ("POST",), prefix=True)(api_rename)
+    route("/api/copy/", ("POST",), prefix=True)(api_copy)
+    route("/api/batch", ("POST",))(api_batch)
@@ -0,0 +1,250 @@
+# ----------------------------------------------------------
+#  PicoWDesk – system information feature module
+#  https://github.com/RyanBruins/PicoWDesk
+#  Licence: MIT
+#
+#  pwd_info.py
+#  -----------
+#  /api/info (+ /history), /api/stats and /api/log. Imported by
+#  main.py on the first of those requests (see FEATURES in
+#  main.py); from then on info_sampler() reads the hardware every
+#  INFO_SAMPLE_MS and /api/info serves the cached snapshot, and
+#  every finished request is counted for /api/stats.
+# ----------------------------------------------------------
+import gc
+import json
+import os
+import time
+import network
+from machine import ADC
+import uasyncio as asyncio
+
+S = None                        # the server core (main.py), bound by setup()
+INFO = {}                       # latest snapshot
+INFO_JSON = None                # INFO pre-serialized; None = re-serialize on next request
+FS_SEEN   = -1                  # S.FS_GEN when fs_* was last read
+HIST_FIELDS = ("mem_free", "fs_free", "cpu_temp", "rssi", "req_rate")
+HIST_RING   = []
+HIST_COUNT  = 0                 # samples taken since the module was loaded
+SAMPLER     = None              # info_sampler() task
+INFO_SAMPLE_MS = INFO_HISTORY_LEN = STATS_MAX_ROUTES = 0   # from config.json
+LAT_BUCKETS = (1, 5, 20, 100, 500)      # histogram bounds in ms; a last bucket takes the rest
+PHASES      = ("parse", "handler", "send")
+STATS       = {}                        # route key → RouteStats
+
+
+def _sample_fs() -> None:
+    global FS_SEEN
+    FS_SEEN = S.FS_GEN
+    st = os.statvfs("/")
+    INFO["fs_total"] = st[0] * st[2]
+    INFO["fs_free"]  = st[0] * st[3]
+    INFO["fs_used"]  = INFO["fs_total"] - INFO["fs_free"]
+
+
+def sample_info() -> None:
+    """Refresh the /api/info snapshot from RAM, flash, ADC and both WLANs."""
+    global INFO_JSON
+    sta = network.WLAN(network.STA_IF)
+    ap  = network.WLAN(network.AP_IF)
+    up  = sta.isconnected()
+    sta_cfg = sta.ifconfig() if up else None
+    INFO["mem_used"] = gc.mem_alloc()
+    INFO["mem_free"] = gc.mem_free()
+    _sample_fs()
+    INFO["ssid"]     = sta.config("ssid") if up else None
+    INFO["ip_sta"]   = sta_cfg[0] if up else None
+    INFO["ip_ap"]    = ap.ifconfig()[0] if ap.active() else None
+    INFO["gateway"]  = sta_cfg[2] if up else None
+    INFO["rssi"]     = sta.status("rssi") if up else 0
+    temp = 27 - (ADC(4).read_u16() * 3.3 / 65535 - 0.706) / 0.001721
+    INFO["cpu_temp"] = round(temp, 1)
+    INFO["mode"]     = S.CFG.get("mode", "AP")
+    INFO["wifi"]     = S.WIFI_STATE                   # connecting / sta / ap
+    INFO_JSON = None
+
+
+def info_json() -> str:
+    """Current snapshot as JSON; only fs_* is refreshed when flash changed."""
+    global INFO_JSON
+    if FS_SEEN != S.FS_GEN:
+        _sample_fs()
+        INFO_JSON = None
+    if INFO_JSON is None:
+        INFO_JSON = json.dumps(INFO)
+    return INFO_JSON
+
+
+def info_history() -> str:
+    """Recent samples as JSON columns, oldest first."""
+    n = min(HIST_COUNT, INFO_HISTORY_LEN)
+    rows = [HIST_RING[i % INFO_HISTORY_LEN] for i in range(HIST_COUNT - n, HIST_COUNT)]
+    return json.dumps({"interval_ms": INFO_SAMPLE_MS, "fields": HIST_FIELDS,
+                       "samples": rows})
+
+
+async def info_sampler() -> None:
+    """Background task: sample, append to the history ring, sleep."""
+    global HIST_COUNT
+    last = S.REQ_COUNT
+    while True:
+        await asyncio.sleep_ms(INFO_SAMPLE_MS)
+        try:
+            sample_info()
+            rate = round((S.REQ_COUNT - last) * 1000 / INFO_SAMPLE_MS, 2)   # requests/s
+            last = S.REQ_COUNT
+            HIST_RING[HIST_COUNT % INFO_HISTORY_LEN] = (
+                INFO["mem_free"], INFO["fs_free"], INFO["cpu_temp"], INFO["rssi"], rate)
+            HIST_COUNT += 1
+        except Exception as e:
+            S.log(f"Sampler: {repr(e)}", "error")
+
+
+# ---- /api/stats: per-route counters, fed by main.py's request_done() ----
+class RouteStats:
+    """Counters for one route; per phase a latency histogram and µs sum."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.status = {}                # code → count
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.alloc = 0                  # heap bytes used, summed over requests without a GC
+        self.alloc_n = 0
+        self.hist = [[0] * (len(LAT_BUCKETS) + 1) for _ in PHASES]
+        self.sum_us = [0] * len(PHASES)
+
+
+def stats_record(req, t0: int, mem: int) -> None:
+    """Account one finished request; t0/mem were taken before its handler ran."""
+    now = time.ticks_us()
+    key = req.route
+    st = STATS.get(key)
+    if st is None:
+        if len(STATS) >= STATS_MAX_ROUTES:
+            key = "other"
+            st = STATS.get(key)
+        if st is None:
+            st = STATS[key] = RouteStats()
+    st.count += 1
+    st.status[req.status] = st.status.get(req.status, 0) + 1
+    st.bytes_in += req.bytes_in
+    st.bytes_out += req.bytes_out
+    used = mem - gc.mem_free()
+    if used >= 0:                       # negative: a collection ran mid-request
+        st.alloc += used
+        st.alloc_n += 1
+    head = req.head_us if req.sent else now
+    for i, us in enumerate((req.parse_us, time.ticks_diff(head, t0),
+                            time.ticks_diff(now, head))):
+        st.sum_us[i] += us
+        b = 0
+        while b < len(LAT_BUCKETS) and us > LAT_BUCKETS[b] * 1000:
+            b += 1
+        st.hist[i][b] += 1
+
+
+def stats_json() -> str:
+    routes = {}
+    for key, st in STATS.items():
+        routes[key] = {
+            "count": st.count, "status": st.status,
+            "bytes_in": st.bytes_in, "bytes_out": st.bytes_out,
+            "alloc_avg": st.alloc // st.alloc_n if st.alloc_n else 0,
+            "latency": {PHASES[i]: {"avg_ms": round(st.sum_us[i] / st.count / 1000, 2),
+                                    "hist": st.hist[i]} for i in range(len(PHASES))}}
+    return json.dumps({"requests": S.REQ_COUNT, "rejected": S.STATS_REJECTED,
+                       "buckets_ms": LAT_BUCKETS, "routes": routes})
+
+
+async def send_stats_prometheus(req) -> None:
+    """Prometheus text format, streamed family by family (unframed, then close)."""
+    w = req.w
+    buckets = LAT_BUCKETS
+    S.send_head(req, 200, "text/plain; version=0.0.4", None)
+    labels = [(k.replace("\\", "\\\\").replace('"', '\\"'), st) for k, st in STATS.items()]
+    w.write(b"# TYPE picowdesk_requests_total counter\n")
+    for k, st in labels:
+        for code, n in st.status.items():
+            w.write(f'picowdesk_requests_total{{route="{k}",code="{code}"}} {n}\n'.encode())
+    w.write(f"# TYPE picowdesk_rejected_total counter\npicowdesk_rejected_total {S.STATS_REJECTED}\n".encode())
+    for name, attr in (("bytes_in", "bytes_in"), ("bytes_out", "bytes_out"),
+                       ("alloc_bytes", "alloc"), ("alloc_samples", "alloc_n")):
+        w.write(f"# TYPE picowdesk_{name}_total counter\n".encode())
+        for k, st in labels:
+            w.write(f'picowdesk_{name}_total{{route="{k}"}} {getattr(st, attr)}\n'.encode())
+    await S.drain(w)
+    w.write(b"# TYPE picowdesk_request_duration_seconds histogram\n")
+    for k, st in labels:
+        for i, phase in enumerate(PHASES):
+            lbl = f'route="{k}",phase="{phase}"'
+            acc = 0
+            for b, n in enumerate(st.hist[i]):
+                acc += n
+                le = buckets[b] / 1000 if b < len(buckets) else "+Inf"
+                w.write(f'picowdesk_request_duration_seconds_bucket{{{lbl},le="{le}"}} {acc}\n'.encode())
+            w.write(f'picowdesk_request_duration_seconds_sum{{{lbl}}} {st.sum_us[i] / 1000000}\n'
+                    f'picowdesk_request_duration_seconds_count{{{lbl}}} {acc}\n'.encode())
+        await S.drain(w)
+
+
+def log_json(after: int) -> str:
+    """Log ring lines numbered above *after*, oldest first."""
+    ring, seq = S.LOG_RING, S.LOG_SEQ
+    first = max(after, seq - len(ring)) + 1
+    return json.dumps({"seq": seq,
+                       "lines": [ring[i % len(ring)] for i in range(first, seq + 1)]})
+
+
+# ---- Route handlers ----
+async def api_info(req) -> None:
+    """System statistics (snapshot from info_sampler)."""
+    await S.send(req, info_json(), "application/json")
+
+
+async def api_info_history(req) -> None:
+    """Last INFO_HISTORY_LEN samples, one row per INFO_SAMPLE_MS."""
+    await S.send(req, info_history(), "application/json")
+
+
+async def api_stats(req) -> None:
+    """Per-route counters and latency histograms (since this module loaded).
+
+    ?format=prometheus for the text exposition format; ?reset clears after reading.
+    """
+    if req.query.get("format") == "prometheus":
+        await send_stats_prometheus(req)
+    else:
+        await S.send(req, stats_json(), "application/json")
+    if "reset" in req.query:
+        STATS.clear()
+
+
+async def api_log(req) -> None:
+    """Recent log lines; ?after=<seq> returns only newer ones."""
+    await S.send(req, log_json(int(req.query.get("after", 0))), "application/json")
+
+
+def setup(server) -> None:
+    """Bind the core, take the first sample, register routes, start sampling."""
+    global S, SAMPLER, HIST_RING, INFO_SAMPLE_MS, INFO_HISTORY_LEN, STATS_MAX_ROUTES
+    S = server
+    INFO_SAMPLE_MS   = S.CFG["INFO_SAMPLE_MS"]
+    INFO_HISTORY_LEN = S.CFG["INFO_HISTORY_LEN"]
+    STATS_MAX_ROUTES = S.CFG["STATS_MAX_ROUTES"]
+    HIST_RING = [None] * INFO_HISTORY_LEN
+    INFO["fw_build"] = os.uname().version.split()[0]     # Pico W Firmware Version
+    INFO["pwd_version"] = S.PICOWDESK_VERSION             # PicoWDesk Version
+    sample_info()
+    S.route("/api/info")(api_info)
+    S.route("/api/info/history")(api_info_history)
+    S.route("/api/stats")(api_stats)
+    S.route("/api/log")(api_log)
+    S.REQUEST_HOOKS.append(stats_record)
+    SAMPLER = asyncio.create_task(info_sampler())
+
+
+def teardown() -> None:
+    """Stop sampling and counting (unload drops the history and /api/stats)."""
+    S.REQUEST_HOOKS.remove(stats_record)
+    SAMPLER.cancel()
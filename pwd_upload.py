@@ -0,0 +1,237 @@
+# ----------------------------------------------------------
+#  PicoWDesk – upload feature module
+#  https://github.com/RyanBruins/PicoWDesk
+#  Licence: MIT
+#
+#  pwd_upload.py
+#  -------------
+#  Resumable, parallel chunked uploads: /api/upload/<file>
+#  and /api/upload/status. Imported by main.py on the first
+#  upload request (see FEATURES in main.py); S is main.py,
+#  W the write path (pwd_write.py).
+# ----------------------------------------------------------
+import json
+import os
+import time
+import uasyncio as asyncio
+import pwd_write as W           # body_to_file, write-behind, truncate_file
+
+S = None                        # the server core (main.py), bound by setup()
+UPLOADS = {}                    # { "<filename>:<token>": UploadSession }
+FINISHED = {}                   # { "<filename>:<token>": (size, ticks_ms) } of completed uploads
+REAPER = None                   # upload_reaper() task
+UPLOAD_IDLE_MS = UPLOAD_FORGET_MS = UPLOAD_MAX_SESSIONS = 0   # from config.json
+
+
+class UploadSession:
+    """One upload in progress: file handle, received byte ranges, last activity.
+
+    Chunks may arrive out of order and concurrently; each is written at its
+    own offset (queued write-behind, see wb_write in pwd_write.py) and recorded
+    in *ranges* (sorted, merged [start, end) pairs) once it is queued. Idle
+    sessions are parked (handle closed, ranges kept) and later forgotten by
+    upload_reaper().
+    """
+
+    def __init__(self, name: str, size, mode: str = "wb") -> None:
+        self.name = name
+        self.size = size                # total bytes, None if the client didn't say
+        self.ranges = []
+        self.busy = 0                   # chunks currently being written
+        self.f = W.wb_open(name, mode)
+        self.touched = time.ticks_ms()
+
+    def file(self):
+        """Return the open handle, re-opening a parked session."""
+        if self.f is None:
+            self.f = W.wb_open(self.name, "r+b")
+        self.touched = time.ticks_ms()
+        return self.f
+
+    def park(self) -> None:
+        """Flush and close the handle but keep the session resumable."""
+        if self.f is not None:
+            W.wb_drain(f=self.f)
+            W.wb_close(self.f)              # later, if a chunk is still arriving
+            self.f = None
+
+    def add(self, start: int, end: int) -> None:
+        """Record bytes [start, end) as received, merging neighbours."""
+        merged = []
+        for s, e in self.ranges:
+            if e < start or s > end:
+                merged.append([s, e])
+            else:
+                start, end = min(s, start), max(e, end)
+        merged.append([start, end])
+        merged.sort()
+        self.ranges = merged
+
+    def next_missing(self) -> int:
+        """Offset of the first byte not yet received."""
+        return self.ranges[0][1] if self.ranges and self.ranges[0][0] == 0 else 0
+
+    def complete(self) -> bool:
+        return self.size is not None and self.next_missing() >= self.size
+
+
+def _close_upload(name: str) -> None:
+    """Flush, close and remove upload entry."""
+    if name in UPLOADS:
+        UPLOADS.pop(name).park()
+
+
+def _evict_upload() -> None:
+    """Make room for a new session by dropping the least recently used idle one."""
+    idle = [k for k in UPLOADS if not UPLOADS[k].busy]
+    if idle:
+        oldest = min(idle, key=lambda k: UPLOADS[k].touched)
+        S.log(f"Upload evicted: {oldest}", "warn")
+        _close_upload(oldest)
+
+
+async def _finish_upload(key: str) -> None:
+    """Close a complete upload, cut off what a longer old file left behind, remember it."""
+    sess = UPLOADS.pop(key)
+    sess.park()
+    if os.stat(sess.name)[6] > sess.size:      # first chunk was not at 0: opened "r+b"
+        W.wb_drain(sess.name)
+        await W.truncate_file(sess.name, sess.size)
+    if len(FINISHED) >= 2 * UPLOAD_MAX_SESSIONS:
+        del FINISHED[min(FINISHED, key=lambda k: FINISHED[k][1])]
+    FINISHED[key] = (sess.size, time.ticks_ms())
+
+
+async def upload_reaper() -> None:
+    """Close handles of idle uploads and forget abandoned (and long finished) ones."""
+    while True:
+        await asyncio.sleep_ms(5000)
+        now = time.ticks_ms()
+        for key in list(FINISHED):
+            if time.ticks_diff(now, FINISHED[key][1]) > UPLOAD_FORGET_MS:
+                del FINISHED[key]
+        for key in list(UPLOADS):
+            sess = UPLOADS[key]
+            if sess.busy:
+                continue
+            idle = time.ticks_diff(now, sess.touched)
+            if idle > UPLOAD_FORGET_MS:
+                S.log(f"Upload abandoned: {key}", "warn")
+                _close_upload(key)
+            elif idle > UPLOAD_IDLE_MS:
+                sess.park()
+
+
+async def handle_upload(req, name: str) -> None:
+    """Handle chunked file upload via /api/upload/<filename>?offset=X&token=Y&size=N&done
+
+    Chunks may be sent in parallel and in any order; the file is closed
+    once every byte up to *size* (or up to the end of the 'done' chunk
+    when no size was given) has arrived. '&abort' drops the session.
+    '&sync=1' answers once the chunk is on flash rather than queued.
+    A chunk of an upload that already finished (a retry whose first answer
+    was lost) is acknowledged without being written again.
+    """
+    params = req.query
+    offset = int(params.get('offset', 0))
+    token  = params.get('token', '0')
+    done   = 'done' in params
+    size   = int(params['size']) if params.get('size') else None
+    key = f"{name}:{token}"
+    if offset < 0 or (size is not None and size < 0):
+        await S.send(req, "offset, size", code=400)    # seek() would fail in the flusher
+        return
+
+    if S.is_restricted(name):
+        await S.send(req, "", code=403)
+        return
+
+    if 'abort' in params:
+        _close_upload(key)
+        await S.send(req, "OK")
+        return
+
+    if key in FINISHED:
+        await S.send(req, "OK")
+        return
+
+    sess = UPLOADS.get(key)
+    if sess is None:
+        # First chunk to arrive (any offset) – check space once, create file.
+        # Only a chunk at 0 empties an existing file: anything else may be a
+        # late chunk of an upload the reaper has already forgotten.
+        try:
+            existing = os.stat(name)[6]         # freed when the file is truncated
+            mode = "wb" if offset == 0 else "r+b"
+        except OSError:
+            existing = 0
+            mode = "wb"
+        if size is not None:
+            fs = os.statvfs("/")
+            if size > fs[0] * fs[3] + existing:
+                await S.send(req, "Insufficient space", code=507)
+                return
+        if len(UPLOADS) >= UPLOAD_MAX_SESSIONS:
+            _evict_upload()
+        sess = UPLOADS[key] = UploadSession(name, size, mode)
+        S.drop_gz(name)
+
+    start = offset
+    end = offset + req.remaining
+    sess.busy += 1
+    try:
+        await W.wb_write(req, sess.file(), name, offset)
+        if 'sync' in params:
+            W.wb_drain(f=sess.f)
+    finally:
+        sess.busy -= 1
+        sess.touched = time.ticks_ms()
+    sess.add(start, end)
+    S.touch(name)
+
+    if done and sess.size is None:
+        sess.size = end
+    if sess.complete():
+        await _finish_upload(key)
+
+    await S.send(req, "OK")
+
+
+async def handle_upload_status(req) -> None:
+    """GET /api/upload/status?name=<file>&token=T – received ranges of a session."""
+    key = f"{req.query.get('name', '')}:{req.query.get('token', '0')}"
+    sess = UPLOADS.get(key)
+    if sess is None and key in FINISHED:
+        size = FINISHED[key][0]
+        await S.send(req, json.dumps({"name": key.rpartition(":")[0], "size": size,
+                                      "received": [[0, size]] if size else [],
+                                      "next": size, "complete": True}), "application/json")
+        return
+    if sess is None:
+        await S.send(req, "No such upload", code=404)
+        return
+    await S.send(req, json.dumps({"name": sess.name, "size": sess.size,
+                                  "received": sess.ranges,
+                                  "next": sess.next_missing(), "complete": False}),
+                 "application/json")
+
+
+def setup(server) -> None:
+    """Bind the core, read config, register routes and start the reaper."""
+    global S, REAPER, UPLOAD_IDLE_MS, UPLOAD_FORGET_MS, UPLOAD_MAX_SESSIONS
+    S = server
+    W.setup(server)
+    UPLOAD_IDLE_MS      = S.CFG["UPLOAD_IDLE_MS"]
+    UPLOAD_FORGET_MS    = S.CFG["UPLOAD_FORGET_MS"]
+    UPLOAD_MAX_SESSIONS = S.CFG["UPLOAD_MAX_SESSIONS"]
+    S.route("/api/upload/", ("POST",), prefix=True)(handle_upload)
+    S.route("/api/upload/status")(handle_upload_status)
+    REAPER = asyncio.create_task(upload_reaper())
+
+
+def teardown() -> None:
+    """Stop the reaper and close every session (unload drops resume state)."""
+    REAPER.cancel()
+    for key in list(UPLOADS):
+        _close_upload(key)
+    FINISHED.clear()
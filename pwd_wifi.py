@@ -0,0 +1,128 @@
+# ----------------------------------------------------------
+#  PicoWDesk – Wi-Fi settings feature module
+#  https://github.com/RyanBruins/PicoWDesk
+#  Licence: MIT
+#
+#  pwd_wifi.py
+#  -----------
+#  /api/scan, /api/connect and /api/mode/{ap,sta}. Imported by
+#  main.py on the first of those requests (see FEATURES in
+#  main.py). Bring-up and the STA link watch stay in main.py
+#  section 4.
+#
+#  WLAN.scan() holds the CPU for a second or two, so it never runs
+#  in a request: scanner() does it when asked and /api/scan answers
+#  from the cached list, asking for a refresh once it is stale.
+# ----------------------------------------------------------
+import json
+import time
+import network
+import uasyncio as asyncio
+
+S = None                        # the server core (main.py), bound by setup()
+SCAN_JSON   = "[]"              # last result, pre-serialized
+SCAN_AT     = None              # ticks_ms of the last scan; None = never scanned
+SCAN_WANTED = asyncio.Event()   # set → scanner() runs a scan
+SCAN_DONE   = asyncio.Event()   # set and replaced after every scan
+SCANNER     = None              # scanner() task
+SCAN_TTL_MS = 0                 # from config.json
+
+
+def scan_now() -> None:
+    """Run one (blocking) scan and cache it, strongest first."""
+    global SCAN_JSON, SCAN_AT
+    sta = network.WLAN(network.STA_IF)
+    sta.active(True)
+    nets = sta.scan()
+    visible = [n for n in nets if n[0] and len(n[0].strip()) > 0]
+    visible.sort(key=lambda n: n[3], reverse=True)   # strongest first
+    SCAN_JSON = json.dumps([{"ssid": n[0].decode(), "rssi": n[3]} for n in visible])
+    SCAN_AT = time.ticks_ms()
+
+
+def scan_age() -> int:
+    """Milliseconds since the cached scan (-1 if there is none)."""
+    return -1 if SCAN_AT is None else time.ticks_diff(time.ticks_ms(), SCAN_AT)
+
+
+async def scanner() -> None:
+    """Background task: scan whenever SCAN_WANTED is set, then wake waiters."""
+    global SCAN_DONE
+    while True:
+        await SCAN_WANTED.wait()
+        while S.WIFI_STATE == "connecting":     # a scan would disturb the join
+            await asyncio.sleep_ms(500)
+        SCAN_WANTED.clear()
+        try:
+            scan_now()
+        except Exception as e:
+            S.log(f"Scan: {repr(e)}", "error")
+        done, SCAN_DONE = SCAN_DONE, asyncio.Event()
+        done.set()
+
+
+async def api_scan(req) -> None:
+    """Cached Wi-Fi scan results, strongest first (age in X-Scan-Age).
+
+    A stale list (older than SCAN_TTL_MS) or ?refresh starts a background
+    scan; ?wait holds the reply until it is done, as does an empty cache.
+    """
+    age = scan_age()
+    if "refresh" in req.query or age < 0 or age > SCAN_TTL_MS:
+        SCAN_WANTED.set()
+        if "wait" in req.query or age < 0:
+            try:
+                await asyncio.wait_for_ms(SCAN_DONE.wait(), S.STA_TIMEOUT_MS)
+            except asyncio.TimeoutError:
+                pass                            # STA join still running – answer with what we have
+    data = SCAN_JSON.encode()
+    S.send_head(req, 200, "application/json", len(data), f"X-Scan-Age: {scan_age()}\r\n")
+    req.w.write(data)
+    await S.drain(req.w)
+
+
+async def api_connect(req) -> None:
+    """{ssid:"", psk:""}  → reboot into STA"""
+    d = json.loads(await S.read_body(req))
+    missing = [k for k in ("ssid", "psk") if not isinstance(d, dict) or not isinstance(d.get(k), str)]
+    if missing:
+        await S.send(req, ", ".join(missing), code=400)
+        return
+    S.CFG["ssid"] = d["ssid"]
+    S.CFG["psk"]  = d["psk"]
+    S.CFG["mode"] = "STA"
+    S.save_config()
+    await S.send(req, "OK")
+    asyncio.create_task(S.reboot_later())
+
+
+async def api_mode_ap(req) -> None:
+    """Force AP mode → reboot"""
+    S.CFG["mode"] = "AP"
+    S.save_config()
+    await S.send(req, "OK")
+    asyncio.create_task(S.reboot_later())
+
+
+async def api_mode_sta(req) -> None:
+    """Force STA mode → reboot"""
+    S.CFG["mode"] = "STA"
+    S.save_config()
+    await S.send(req, "OK")
+    asyncio.create_task(S.reboot_later())
+
+
+def setup(server) -> None:
+    """Bind the core, register this module's routes and start the scanner."""
+    global S, SCANNER, SCAN_TTL_MS
+    S = server
+    SCAN_TTL_MS = S.CFG["SCAN_TTL_MS"]
+    S.route("/api/scan")(api_scan)
+    S.route("/api/connect", ("POST",))(api_connect)
+    S.route("/api/mode/ap", ("POST",))(api_mode_ap)
+    S.route("/api/mode/sta", ("POST",))(api_mode_sta)
+    SCANNER = asyncio.create_task(scanner())
+
+
+def teardown() -> None:
+    SCANNER.cancel()
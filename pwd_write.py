@@ -0,0 +1,221 @@
+# ----------------------------------------------------------
+#  PicoWDesk – write path library
+#  https://github.com/RyanBruins/PicoWDesk
+#  Licence: MIT
+#
+#  pwd_write.py
+#  ------------
+#  Request bodies to flash: body_to_file(), the write-behind
+#  queue and truncate_file(). No routes of its own: pwd_files
+#  and pwd_upload import it and call setup() from theirs. Once
+#  imported it stays, so queued blocks are flushed even after the
+#  module that queued them was unloaded; main.py's wb_drain()
+#  reaches it through sys.modules.
+# ----------------------------------------------------------
+import os
+import uasyncio as asyncio
+
+S = None                        # the server core (main.py), bound by the first setup()
+WB_BLOCKS = WB_DELAY_MS = 0     # from config.json
+
+
+async def body_to_file(req, f, offset: int = None) -> int:
+    """Copy the request body straight into open file *f* through a pooled buffer.
+
+    With *offset*, every block is written at its absolute position, so
+    several requests may stream into the same file concurrently.
+    """
+    item = S._get_io_buf()
+    buf, mv = item[0], item[1]
+    total = 0
+    try:
+        while req.remaining:
+            n = await S.recv_into(req, mv)
+            if offset is not None:
+                f.seek(offset + total)
+            f.write(buf if n == S.CHUNK else mv[:n])
+            total += n
+    finally:
+        S.BUF_POOL.append(item)
+    return total
+
+
+# ---- Write-behind: bodies are acknowledged once in RAM, flushed in the background ----
+#      Blocks come from S.BUF_POOL; at most WB_BLOCKS are queued, beyond that the
+#      writer flushes inline (backpressure). Entries are kept per open handle:
+#      [name, file, offset, pool item, bytes used, sealed]. Anything that opens
+#      a file by name calls wb_drain(name) first, so readers never see old data.
+WB_QUEUE = []                   # entries in arrival order
+WB_CLOSE = []                   # handles to close once their last block is on flash
+WB_EVENT = asyncio.Event()      # set → wb_flusher() has work
+
+
+def wb_drain(name: str = None, f=None, max_blocks: int = 0) -> int:
+    """Write queued blocks now – all, one file's or one handle's – in order.
+
+    Blocks still being filled are skipped, and so is everything queued
+    after them for the same handle. Returns the number of blocks written.
+    """
+    held, done, n = [], [], 0           # done: (handle, name) pairs written to
+    i = 0
+    try:
+        while i < len(WB_QUEUE) and not (max_blocks and n >= max_blocks):
+            e = WB_QUEUE[i]
+            if (name is not None and e[0] != name) or (f is not None and e[1] is not f):
+                i += 1
+            elif not e[5] or e[1] in held:
+                held.append(e[1])
+                i += 1
+            else:
+                WB_QUEUE.pop(i)
+                if (e[1], e[0]) not in done:
+                    done.append((e[1], e[0]))
+                try:
+                    e[1].seek(e[2])
+                    e[1].write(e[3][1][:e[4]])
+                finally:
+                    S.BUF_POOL.append(e[3])
+                n += 1
+    finally:
+        for fh, fname in done:
+            if fh in WB_CLOSE and not any(x[1] is fh for x in WB_QUEUE):
+                WB_CLOSE.remove(fh)
+                fh.close()
+            elif fh not in WB_CLOSE:
+                fh.flush()
+            S.touch(fname)              # new size for /api/list and free space
+    return n
+
+
+async def _wb_room(f) -> None:
+    """Wait until fewer than WB_BLOCKS are queued. Only *f*'s own blocks are
+    written inline, so a failing write never lands on another file's request."""
+    while len(WB_QUEUE) >= WB_BLOCKS:
+        if not wb_drain(f=f):
+            WB_EVENT.set()              # other files' blocks: wb_flusher writes them
+            await asyncio.sleep_ms(10)
+
+
+async def _wb_block(name: str, f, offset: int) -> list:
+    """A fresh queue entry, once there is room for one."""
+    await _wb_room(f)
+    e = [name, f, offset, S._get_io_buf(), 0, False]
+    WB_QUEUE.append(e)
+    return e
+
+
+def _wb_tail(f, offset: int):
+    """The last queued block of *f*, if it ends at *offset* and has room (coalescing)."""
+    for e in reversed(WB_QUEUE):
+        if e[1] is f:
+            return e if e[5] and e[2] + e[4] == offset and e[4] < S.CHUNK else None
+    return None
+
+
+async def wb_write(req, f, name: str, offset: int = 0) -> int:
+    """Queue the request body for handle *f* at *offset*; returns its length.
+
+    The handler may answer as soon as this returns; wb_flusher() puts the
+    data on flash. With WRITE_BEHIND_BLOCKS 0 this is body_to_file().
+    """
+    if not WB_BLOCKS:
+        return await body_to_file(req, f, offset)
+    total = 0
+    e = _wb_tail(f, offset)
+    if e:
+        e[5] = False                    # top it up rather than start a new block
+    try:
+        while req.remaining:
+            if e is None or e[4] == S.CHUNK:
+                if e:
+                    e[5] = True
+                e = await _wb_block(name, f, offset + total)
+            n = await S.recv_into(req, e[3][1][e[4]:])
+            e[4] += n
+            total += n
+    finally:
+        if e:
+            e[5] = True
+        WB_EVENT.set()
+    return total
+
+
+async def wb_put(name: str, f, data: bytes) -> None:
+    """Queue in-RAM *data* at the start of handle *f* (/api/batch writes)."""
+    if not WB_BLOCKS:
+        f.write(data)
+        return
+    for i in range(0, len(data), S.CHUNK):
+        await _wb_room(f)
+        part = data[i:i + S.CHUNK]
+        e = [name, f, i, S._get_io_buf(), len(part), True]
+        e[3][0][:len(part)] = part
+        WB_QUEUE.append(e)
+    WB_EVENT.set()
+
+
+def wb_open(name: str, mode: str = "wb"):
+    """Open *name* once the blocks queued for it (on older handles) are on flash."""
+    if WB_QUEUE:
+        wb_drain(name)
+    return open(name, mode)
+
+
+def wb_close(f) -> None:
+    """Close *f* now, or once its last queued block is written."""
+    if any(e[1] is f for e in WB_QUEUE):
+        WB_CLOSE.append(f)
+    else:
+        f.close()
+
+
+async def wb_flusher() -> None:
+    """Background task: write queued blocks a couple at a time, yielding between."""
+    while True:
+        await WB_EVENT.wait()
+        WB_EVENT.clear()
+        await asyncio.sleep_ms(WB_DELAY_MS)
+        try:
+            while wb_drain(max_blocks=2):
+                await asyncio.sleep_ms(0)
+        except Exception as e:          # flash full, handle closed underneath us
+            S.log(f"Write-behind: {repr(e)}", "error")
+
+
+# ---- Shrinking a file in place (/api/patch truncate, uploads over a longer file) ----
+async def truncate_file(name: str, length: int) -> None:
+    """Cut a file to *length* bytes.
+
+    MicroPython's file objects have no truncate(), so the kept part is
+    copied to '<name>.tmp', which then replaces the file (one rename).
+    """
+    with open(name, "r+b") as f:
+        if hasattr(f, "truncate"):
+            f.truncate(length)
+            return
+    item = S._get_io_buf()
+    buf, mv = item[0], item[1]
+    try:
+        with open(name, "rb") as fi, open(name + ".tmp", "wb") as fo:
+            left = length
+            while left:
+                n = fi.readinto(buf if left >= S.CHUNK else mv[:left])
+                if not n:
+                    break
+                fo.write(buf if n == S.CHUNK else mv[:n])
+                left -= n
+                await asyncio.sleep_ms(0)
+    finally:
+        S.BUF_POOL.append(item)
+    os.rename(name + ".tmp", name)
+
+
+def setup(server) -> None:
+    """Bind the core, read config and start the flusher (first caller only)."""
+    global S, WB_BLOCKS, WB_DELAY_MS
+    if S is not None:
+        return
+    S = server
+    WB_BLOCKS   = S.CFG["WRITE_BEHIND_BLOCKS"]
+    WB_DELAY_MS = S.CFG["WRITE_BEHIND_DELAY_MS"]
+    asyncio.create_task(wb_flusher())
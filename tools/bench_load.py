@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------
+#  PicoWDesk – load-test benchmark
+#
+#  python3 tools/bench_load.py [--root DIR | --url http://<pico-ip>]
+#                              [--mix boot,chat,upload,download]
+#  python3 tools/bench_load.py --compare REV_A REV_B [--mix …]
+#
+#  Plays realistic client mixes against a server and prints,
+#  per mix, req/s, p50/p99 latency per request kind, throughput
+#  and peak heap:
+#    boot     – desktop boot storm: index.html + /api/bundle
+#               (or /api/list + one request per icon before it)
+#    chat     – Chat.html long-pollers and one sender; "deliver"
+#               is the time from send to a poller seeing it
+#    upload   – concurrent chunked uploads via /api/upload
+#    download – concurrent /api/download of a large file
+#  The work is a fixed number of requests, so runs are
+#  reproducible. Without --url the server is main.py on the
+#  host harness (tools/host), started on a free port, and the
+#  peak heap is exact (tracemalloc); against a Pico it is the
+#  highest mem_used /api/info reported during the mix.
+#  --compare packages two git revisions ("." = working tree)
+#  with package-everything.sh and runs the mixes on both. A
+#  mix in which every request fails stops the run with the end
+#  of the server log instead of printing meaningless figures.
+# ----------------------------------------------------------
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+MIXES = ("boot", "chat", "upload", "download")
+TIMEOUT = 30                    # seconds per request
+
+
+# ---- Minimal HTTP/1.1 client (keep-alive, Content-Length or close) ----
+class Conn:
+    def __init__(self, host: str, port: int) -> None:
+        self.host, self.port = host, port
+        self.r = self.w = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: str = ""):
+        """Return (status, headers dict, body bytes); reconnects as needed.
+
+        A kept-alive connection the server has closed meanwhile (as servers
+        without keep-alive do after every response) is retried once on a new
+        one, like a browser does.
+        """
+        while True:
+            reused = self.w is not None
+            if not reused:
+                self.r, self.w = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.w.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                             f"Content-Length: {len(body)}\r\n{headers}\r\n".encode() + body)
+                await self.w.drain()
+                line = await self.r.readline()
+            except ConnectionError:
+                line = b""
+            if line:
+                break
+            self.close()
+            if not reused:
+                raise ConnectionError("closed before the status line")
+        status = int(line.split()[1])
+        hdrs = {}
+        while True:
+            line = await self.r.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode().partition(":")
+            hdrs[k.strip().lower()] = v.strip()
+        if method == "HEAD" or status == 304:   # framed, but no body
+            data = b""
+        elif "content-length" in hdrs:
+            data = await self.r.readexactly(int(hdrs["content-length"]))
+        else:
+            data = await self.r.read()
+            hdrs["connection"] = "close"
+        if hdrs.get("connection", "").lower() == "close":
+            self.close()
+        return status, hdrs, data
+
+    def close(self) -> None:
+        if self.w is not None:
+            self.w.close()
+            self.r = self.w = None
+
+
+class Recorder:
+    """Latencies (ms) per request kind, bytes moved, failures and 503s."""
+
+    def __init__(self) -> None:
+        self.ops = {}
+        self.bytes = 0
+        self.errors = 0
+        self.rejected = 0               # 503: over MAX_CONN (not in the latencies)
+        self.requests = 0
+
+    def add(self, op: str, ms: float, nbytes: int = 0) -> None:
+        self.ops.setdefault(op, []).append(ms)
+        self.bytes += nbytes
+
+    async def call(self, conn: Conn, op: str, method: str, path: str,
+                   body: bytes = b"", headers: str = ""):
+        t0 = time.perf_counter()
+        self.requests += 1
+        try:
+            status, hdrs, data = await asyncio.wait_for(
+                conn.request(method, path, body, headers), TIMEOUT)
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            conn.close()
+            self.errors += 1
+            return None, b""
+        if status == 503:
+            self.rejected += 1
+            return status, data
+        if status >= 500:
+            self.errors += 1
+        self.add(op, (time.perf_counter() - t0) * 1000, len(body) + len(data))
+        return status, data
+
+
+def percentile(values: list, q: float) -> float:
+    v = sorted(values)
+    return v[max(0, min(len(v) - 1, int(q * len(v) + 0.999999) - 1))]
+
+
+# ---- Client mixes ----
+async def mix_boot(host, port, rec, a) -> None:
+    async def desktop():
+        for _ in range(a.rounds):
+            t0 = time.perf_counter()
+            c = Conn(host, port)
+            await rec.call(c, "index", "GET", "/", headers="Accept-Encoding: gzip\r\n")
+            status, data = await rec.call(c, "bundle", "GET", "/api/bundle",
+                                          headers="Accept-Encoding: gzip\r\n")
+            if status == 404:                   # before /api/bundle: list, then each icon
+                status, data = await rec.call(c, "list", "GET", "/api/list?ext=.html")
+                names = [f["name"] for f in json.loads(data)] if status == 200 else []
+                for n in names:
+                    await rec.call(c, "icon", "GET", "/" + n[:-5] + ".ico")
+            c.close()
+            rec.add("desktop", (time.perf_counter() - t0) * 1000)
+    await asyncio.gather(*(desktop() for _ in range(a.clients)))
+
+
+async def mix_chat(host, port, rec, a) -> None:
+    done = asyncio.Event()
+    c = Conn(host, port)
+    status, data = await rec.call(c, "history", "GET", "/api/chat/history")
+    start = max([m["id"] for m in json.loads(data)] or [0]) if status == 200 else 0
+    c.close()
+
+    async def poller():
+        conn, after = Conn(host, port), start
+        while not done.is_set():
+            t0 = time.perf_counter()
+            status, data = await rec.call(conn, "poll", "GET",
+                                          f"/api/chat/poll?after={after}&wait=5000")
+            msgs = json.loads(data) if status == 200 and data else None
+            for m in msgs or []:
+                after = max(after, m["id"])
+                if m["name"] == "bench" and m["message"] != "end":
+                    rec.add("deliver", (time.perf_counter() - float(m["message"])) * 1000)
+            if not msgs and time.perf_counter() - t0 < 0.5:
+                await asyncio.sleep(1)          # server without long-polling: poll every second
+        conn.close()
+
+    async def sender():
+        conn = Conn(host, port)
+        for _ in range(a.rounds * 10):
+            msg = json.dumps({"name": "bench", "message": repr(time.perf_counter())})
+            await rec.call(conn, "send", "POST", "/api/chat/send", msg.encode())
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(1)
+        done.set()
+        await rec.call(conn, "send", "POST", "/api/chat/send",
+                       b'{"name":"bench","message":"end"}')
+        conn.close()
+    await asyncio.gather(sender(), *(poller() for _ in range(a.clients)))
+
+
+def payload(size: int) -> bytes:
+    return bytes(range(256)) * (size // 256) + bytes(size % 256)
+
+
+async def upload(host, port, rec, name: str, data: bytes, op: str, chunk: int = 32768,
+                 parallel: int = 3) -> None:
+    """Upload like FileManager.html: *parallel* chunks in flight, failed ones retried."""
+    base = f"/api/upload/{name}?token={time.time_ns()}&size={len(data)}"
+    todo = [(o, 0) for o in range(0, len(data), chunk)] or [(0, 0)]
+
+    async def worker():
+        conn = Conn(host, port)
+        while todo:
+            o, tries = todo.pop(0)
+            end = min(o + chunk, len(data))
+            status, _ = await rec.call(conn, op, "POST", f"{base}&offset={o}" +
+                                       ("&done=1" if end >= len(data) else ""), data[o:end])
+            if status != 200 and tries < 5:
+                todo.append((o, tries + 1))
+                await asyncio.sleep(0.2 * (tries + 1))
+        conn.close()
+    await asyncio.gather(*(worker() for _ in range(parallel)))
+
+
+async def mix_upload(host, port, rec, a) -> None:
+    data = payload(a.size_kb * 1024)
+
+    async def client(i):
+        for r in range(a.rounds):
+            t0 = time.perf_counter()
+            await upload(host, port, rec, f"bench_up{i}.bin", data, "chunk")
+            rec.add("file", (time.perf_counter() - t0) * 1000)
+    await asyncio.gather(*(client(i) for i in range(a.clients)))
+    await delete_files(host, port, [f"bench_up{i}.bin" for i in range(a.clients)])
+
+
+async def mix_download(host, port, rec, a) -> None:
+    async def client():
+        c = Conn(host, port)
+        for _ in range(a.rounds):
+            status, data = await rec.call(c, "file", "GET", "/api/download/bench_dl.bin")
+            if status == 200 and len(data) != a.size_kb * 1024:
+                rec.errors += 1
+        c.close()
+    await asyncio.gather(*(client() for _ in range(a.clients)))
+
+
+async def setup_download(host, port, a) -> None:
+    await upload(host, port, Recorder(), "bench_dl.bin", payload(a.size_kb * 1024), "setup")
+
+
+async def cleanup_download(host, port) -> None:
+    await delete_files(host, port, ["bench_dl.bin"])
+
+
+async def delete_files(host, port, names: list) -> None:
+    """Remove the mix's files; a server that drops the connection just leaves them."""
+    c = Conn(host, port)
+    for name in names:
+        try:
+            await asyncio.wait_for(c.request("POST", f"/api/delete/{name}"), TIMEOUT)
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            c.close()
+    c.close()
+
+
+# ---- Running mixes against one server ----
+class Server:
+    """main.py from *root* on the host harness, on a free port."""
+
+    def __init__(self, root: str) -> None:
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        self.port = s.getsockname()[1]
+        s.close()
+        self.tmp = tempfile.mkdtemp(prefix="picowdesk_srv_")
+        self.peak_file = os.path.join(self.tmp, "peak")
+        self.log = open(os.path.join(self.tmp, "server.log"), "w")
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "host", "run_host.py"), "--root", root,
+             "--port", str(self.port), "--peak-file", self.peak_file],
+            stdout=self.log, stderr=subprocess.STDOUT)
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", self.port), 0.1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"server did not start, see {self.log.name}")
+
+    def peak_heap(self) -> int:
+        """Peak heap since the previous call."""
+        if os.path.exists(self.peak_file):
+            os.remove(self.peak_file)
+        self.proc.send_signal(signal.SIGUSR1)
+        for _ in range(50):
+            try:
+                with open(self.peak_file) as f:
+                    return int(f.read())
+            except (OSError, ValueError):
+                time.sleep(0.02)
+        return -1
+
+    def log_tail(self, lines: int = 5) -> str:
+        self.log.flush()
+        with open(self.log.name) as f:
+            return "".join(f.readlines()[-lines:])
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        self.proc.wait()
+        self.log.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+async def device_heap(host, port, stop: asyncio.Event) -> int:
+    """Highest mem_used /api/info reports until *stop* (Pico: no tracemalloc)."""
+    c, peak = Conn(host, port), -1
+    while not stop.is_set():
+        try:
+            status, _, data = await asyncio.wait_for(c.request("GET", "/api/info"), TIMEOUT)
+            if status == 200:
+                peak = max(peak, json.loads(data).get("mem_used", -1))
+        except (OSError, ConnectionError, asyncio.TimeoutError, ValueError):
+            c.close()
+        try:
+            await asyncio.wait_for(stop.wait(), 1)
+        except asyncio.TimeoutError:
+            pass
+    c.close()
+    return peak
+
+
+async def run_mixes(host: str, port: int, a, server: Server = None) -> dict:
+    results = {}
+    for mix in a.mix:
+        if mix == "download":
+            await setup_download(host, port, a)
+        rec = Recorder()
+        if server:
+            server.peak_heap()
+        else:
+            stop = asyncio.Event()
+            heap_task = asyncio.create_task(device_heap(host, port, stop))
+        t0 = time.perf_counter()
+        await globals()["mix_" + mix](host, port, rec, a)
+        elapsed = time.perf_counter() - t0
+        if server:
+            heap = server.peak_heap()
+        else:
+            stop.set()
+            heap = await heap_task
+        if mix == "download":
+            await cleanup_download(host, port)
+        if rec.requests and rec.errors == rec.requests:
+            raise RuntimeError(f"every {mix} request failed")   # nothing worth comparing
+        results[mix] = {
+            "elapsed_s": round(elapsed, 3), "requests": rec.requests, "errors": rec.errors,
+            "rejected": rec.rejected,
+            "req_s": round(rec.requests / elapsed, 1),
+            "kb_s": round(rec.bytes / 1024 / elapsed, 1), "peak_heap": heap,
+            "ops": {op: {"n": len(v), "p50_ms": round(percentile(v, 0.5), 1),
+                         "p99_ms": round(percentile(v, 0.99), 1)}
+                    for op, v in rec.ops.items()}}
+    return results
+
+
+def run_local(root: str, a) -> dict:
+    server = Server(root)
+    try:
+        return asyncio.run(run_mixes("127.0.0.1", server.port, a, server))
+    except RuntimeError as e:
+        raise RuntimeError(f"{e}; server log ends:\n{server.log_tail()}") from None
+    finally:
+        server.stop()
+
+
+def package(rev: str, workdir: str) -> str:
+    """Export *rev* ("." = working tree), run package-everything.sh, return deploy/."""
+    tree = os.path.join(workdir, "worktree" if rev == "." else rev.replace("/", "_"))
+    if rev == ".":
+        shutil.copytree(REPO, tree, ignore=shutil.ignore_patterns(".git", "deploy"))
+    else:
+        os.makedirs(tree)
+        archive = subprocess.run(["git", "-C", REPO, "archive", rev],
+                                 check=True, capture_output=True).stdout
+        subprocess.run(["tar", "-x", "-C", tree], input=archive, check=True)
+    subprocess.run(["bash", "package-everything.sh"], cwd=tree, check=True,
+                   stdout=subprocess.DEVNULL)
+    return os.path.join(tree, "deploy")
+
+
+# ---- Reports ----
+def fmt_heap(n: int) -> str:
+    return "n/a" if n < 0 else f"{n / 1024:.1f} KB"
+
+
+def print_results(label: str, results: dict) -> None:
+    print(f"== {label}")
+    for mix, r in results.items():
+        print(f"{mix}: {r['requests']} requests in {r['elapsed_s']} s = {r['req_s']} req/s, "
+              f"{r['kb_s']} KB/s, {r['errors']} errors, {r['rejected']} × 503, peak heap {fmt_heap(r['peak_heap'])}")
+        for op, o in r["ops"].items():
+            print(f"   {op:<10}{o['n']:>6}   p50 {o['p50_ms']:>8} ms   p99 {o['p99_ms']:>8} ms")
+
+
+def print_compare(a: str, ra: dict, b: str, rb: dict) -> None:
+    def row(name, va, vb, unit=""):
+        delta = f"{(vb - va) / va * 100:+.0f}%" if va else ""
+        print(f"   {name:<22}{va:>12}{vb:>12}{delta:>9} {unit}")
+    print(f"{'':<25}{a[:12]:>12}{b[:12]:>12}")
+    for mix in ra:
+        if mix not in rb:
+            continue
+        x, y = ra[mix], rb[mix]
+        print(f"{mix}")
+        row("req/s", x["req_s"], y["req_s"])
+        row("KB/s", x["kb_s"], y["kb_s"])
+        row("errors", x["errors"], y["errors"])
+        row("503s", x["rejected"], y["rejected"])
+        row("peak heap", x["peak_heap"], y["peak_heap"], "B")
+        for op in x["ops"]:
+            if op in y["ops"]:
+                row(f"{op} p50", x["ops"][op]["p50_ms"], y["ops"][op]["p50_ms"], "ms")
+                row(f"{op} p99", x["ops"][op]["p99_ms"], y["ops"][op]["p99_ms"], "ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="PicoWDesk load-test benchmark")
+    where = ap.add_mutually_exclusive_group()
+    where.add_argument("--root", help="deploy folder to serve on the host harness (default: ./deploy)")
+    where.add_argument("--url", help="running server, e.g. http://192.168.4.1")
+    where.add_argument("--compare", nargs=2, metavar="REV", help="two git revisions ('.' = working tree)")
+    ap.add_argument("--mix", default=",".join(MIXES), help="comma-separated subset of " + ",".join(MIXES))
+    ap.add_argument("--clients", type=int, default=4, help="concurrent clients per mix")
+    ap.add_argument("--rounds", type=int, default=3, help="repetitions per client")
+    ap.add_argument("--size-kb", type=int, default=128, help="upload/download file size")
+    ap.add_argument("--json", help="also write the results here")
+    a = ap.parse_args()
+    a.mix = [m for m in a.mix.split(",") if m]
+    for m in a.mix:
+        if m not in MIXES:
+            ap.error(f"unknown mix {m}")
+
+    if a.compare:
+        work = tempfile.mkdtemp(prefix="picowdesk_bench_")
+        results = {}
+        try:
+            for rev in a.compare:
+                try:
+                    results[rev] = run_local(package(rev, work), a)
+                except RuntimeError as e:
+                    sys.exit(f"{rev}: {e}")
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        for rev in a.compare:
+            print_results(rev, results[rev])
+        print_compare(a.compare[0], results[a.compare[0]], a.compare[1], results[a.compare[1]])
+    elif a.url:
+        host_port = a.url.split("://", 1)[-1].split("/", 1)[0]
+        host, _, port = host_port.partition(":")
+        try:
+            results = asyncio.run(run_mixes(host, int(port or 80), a))
+        except RuntimeError as e:
+            sys.exit(f"{a.url}: {e}")
+        print_results(a.url, results)
+    else:
+        root = a.root or os.path.join(REPO, "deploy")
+        if not os.path.isdir(root):
+            ap.error(f"{root} not found – run ./package-everything.sh first or pass --root")
+        try:
+            results = run_local(os.path.abspath(root), a)
+        except RuntimeError as e:
+            sys.exit(f"{root}: {e}")
+        print_results(root, results)
+    if a.json:
+        with open(a.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------
+#  PicoWDesk – send-path throughput benchmark
+#
+#  python3 tools/bench_send.py [size_kb] [repeat]
+#  micropython tools/bench_send.py [size_kb] [repeat]
+#  python3 tools/bench_send.py --url http://<pico-ip>/<file> [repeat]
+#
+#  Local mode streams a temp file through the old static and
+#  download loops (copied below as they were before send_file)
+#  and through main.send_file(), into a fake uasyncio stream
+#  whose "socket" accepts at most SNDBUF bytes per write like
+#  lwIP. It prints KB/s and heap use per run:
+#    MicroPython – bytes allocated (GC disabled during the run)
+#    CPython     – peak bytes above the start (tracemalloc)
+#  --url mode downloads a file over HTTP and prints KB/s, to
+#  compare two firmware revisions on the real device.
+# ----------------------------------------------------------
+import gc
+import os
+import sys
+import time
+
+HERE = sys.argv[0].rsplit("/", 1)[0] if "/" in sys.argv[0] else "."
+sys.path.insert(0, HERE + "/host")
+sys.path.append(HERE + "/..")
+
+MICROPYTHON = sys.implementation.name == "micropython"
+if not MICROPYTHON:
+    import tracemalloc
+    from run_host import patch_micropython_builtins
+    patch_micropython_builtins()
+
+import uasyncio as asyncio
+
+SNDBUF = 2920                   # lwIP TCP_SND_BUF on the Pico W (2 × MSS)
+
+
+class FakeStream:
+    """Write side of a uasyncio Stream over a socket with a small send buffer.
+
+    Like MicroPython's Stream.write(), data the socket can't take at once is
+    copied into out_buf; drain() flushes it and yields.
+    """
+
+    def __init__(self) -> None:
+        self.out_buf = b""
+        self.sent = 0
+
+    def write(self, buf) -> None:
+        if not self.out_buf:
+            n = min(len(buf), SNDBUF)
+            self.sent += n
+            if n == len(buf):
+                return
+            buf = buf[n:]
+        self.out_buf += buf
+
+    async def drain(self) -> None:
+        self.sent += len(self.out_buf)
+        self.out_buf = b""
+        await asyncio.sleep_ms(0)
+
+
+# ---- the two loops replaced by main.send_file() ----
+async def legacy_static(w, f, size: int) -> None:
+    remaining = size
+    while remaining > 0:
+        chunk = f.read(min(512, remaining))
+        if not chunk:
+            break
+        w.write(chunk)
+        await w.drain()
+        remaining -= len(chunk)
+        await asyncio.sleep_ms(1)
+
+
+async def legacy_download(w, f, size: int, chunk_size: int, max_single: int) -> None:
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        mv = memoryview(chunk)
+        for i in range(0, len(mv), max_single):
+            w.write(mv[i:i + max_single])
+            await w.drain()
+
+
+def heap_start():
+    gc.collect()
+    if MICROPYTHON:
+        gc.disable()
+        return gc.mem_alloc()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def heap_stop(start: int) -> int:
+    if MICROPYTHON:
+        used = gc.mem_alloc() - start
+        gc.enable()
+        return used
+    used = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return used
+
+
+def run_local(size_kb: int, repeat: int) -> None:
+    import main
+    path = "/tmp/picowdesk_bench.bin"
+    size = size_kb * 1024
+    with open(path, "wb") as f:
+        block = bytes(range(256)) * 4
+        for _ in range(size // len(block)):
+            f.write(block)
+
+    cases = (
+        ("static (before)", lambda w, f: legacy_static(w, f, size)),
+        ("download (before)", lambda w, f: legacy_download(w, f, size, main.CHUNK,
+                                                           main.MAX_SINGLE_SEND)),
+        ("send_file (after)", lambda w, f: main.send_file(w, f, size)),
+    )
+    print(f"{size_kb} KB file, CHUNK={main.CHUNK}, MAX_SINGLE_SEND={main.MAX_SINGLE_SEND}, "
+          f"SNDBUF={SNDBUF}, {sys.implementation.name}")
+    print(f"{'path':<20}{'KB/s':>10}{'heap bytes':>14}")
+    for label, fn in cases:
+        asyncio.run(fn(FakeStream(), open(path, "rb")))     # warm-up (send buffer pool)
+        best_rate, heap = 0, 0
+        for _ in range(repeat):
+            w = FakeStream()
+            with open(path, "rb") as f:
+                start = heap_start()
+                t0 = time.ticks_us()
+                asyncio.run(fn(w, f))
+                dt = time.ticks_diff(time.ticks_us(), t0)
+                heap = max(heap, heap_stop(start))
+            assert w.sent == size, (label, w.sent)
+            best_rate = max(best_rate, size / 1024 / (dt / 1e6))
+        print(f"{label:<20}{best_rate:>10.0f}{heap:>14}")
+    os.remove(path)
+
+
+def run_url(url: str, repeat: int) -> None:
+    import socket
+    host_port, _, path = url.split("://", 1)[1].partition("/")
+    host, _, port = host_port.partition(":")
+    addr = socket.getaddrinfo(host, int(port or 80))[0][-1]
+    buf = bytearray(4096)
+    for i in range(repeat):
+        s = socket.socket()
+        s.connect(addr)
+        t0 = time.ticks_us()
+        s.send(f"GET /{path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        total = 0
+        while True:
+            n = s.readinto(buf) if MICROPYTHON else s.recv_into(buf)
+            if not n:
+                break
+            total += n
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        s.close()
+        print(f"run {i + 1}: {total} bytes in {dt / 1000:.0f} ms = {total / 1024 / (dt / 1e6):.0f} KB/s")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "--url":
+        run_url(args[1], int(args[2]) if len(args) > 2 else 5)
+    else:
+        run_local(int(args[0]) if args else 256, int(args[1]) if len(args) > 1 else 5)
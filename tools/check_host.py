@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------
+#  PicoWDesk – host regression checks
+#
+#  python3 tools/check_host.py [NAME …]
+#
+#  Serves main.py + pwd_*.py from a scratch folder on the host
+#  harness (tools/host) and checks request parsing and the
+#  behaviour that is easy to break without noticing in a
+#  browser: /api/list deltas across reboots, error statuses,
+#  caching headers. Prints one line per check and exits 1 if
+#  any failed; NAME runs only the checks of that name.
+# ----------------------------------------------------------
+import asyncio
+import glob
+import gzip
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+
+from bench_load import REPO, Conn, Server
+
+CHECKS = []                     # (name, async fn(host)), in definition order
+
+
+def check(fn):
+    CHECKS.append((fn.__name__[6:], fn))
+    return fn
+
+
+class Host:
+    """A scratch copy of the server files, served by the harness; restart() = reboot."""
+
+    def __init__(self) -> None:
+        self.root = tempfile.mkdtemp(prefix="picowdesk_check_")
+        for path in ["main.py", "config.json", "index.html"] + glob.glob(os.path.join(REPO, "pwd_*.py")):
+            shutil.copy(os.path.join(REPO, path), self.root)
+        self.set_config(RATE_LIMIT=0)       # every check comes from 127.0.0.1
+        self.srv = Server(self.root)
+
+    def conn(self) -> Conn:
+        return Conn("127.0.0.1", self.srv.port)
+
+    async def get(self, path: str, method: str = "GET", body: bytes = b"", headers: str = ""):
+        c = self.conn()
+        try:
+            return await c.request(method, path, body, headers)
+        finally:
+            c.close()
+
+    def raw(self, data: bytes) -> bytes:
+        """Send *data* as is; everything the server answers until it closes."""
+        s = socket.create_connection(("127.0.0.1", self.srv.port), 5)
+        s.sendall(data)
+        out = b""
+        while True:
+            part = s.recv(4096)
+            if not part:
+                break
+            out += part
+        s.close()
+        return out
+
+    def set_config(self, **cfg) -> None:
+        """Merge *cfg* into config.json (read at the next boot)."""
+        path = os.path.join(self.root, "config.json")
+        with open(path) as f:
+            conf = json.load(f)
+        conf.update(cfg)
+        with open(path, "w") as f:
+            json.dump(conf, f)
+
+    def restart(self, **cfg) -> None:
+        """Reboot the server, with *cfg* merged into config.json first."""
+        self.srv.stop()
+        if cfg:
+            self.set_config(**cfg)
+        self.srv = Server(self.root)
+
+    def close(self) -> None:
+        self.srv.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def expect(cond, what: str) -> None:
+    if not cond:
+        raise AssertionError(what)
+
+
+async def list_since(h: Host, since: str) -> dict:
+    status, _, data = await h.get(f"/api/list?since={since}")
+    expect(status == 200, f"?since={since}: {status}")
+    return json.loads(data)
+
+
+# ---- /api/list?since= ----
+@check
+async def check_since_fresh_boot(h: Host) -> None:
+    d = await list_since(h, "0")
+    expect(d["full"] and any(e["name"] == "index.html" for e in d["changed"]),
+           f"bare ?since=0 after boot must be a full list: {d}")
+    d = await list_since(h, d["gen"])
+    expect(not d["full"] and d["changed"] == [] and d["removed"] == [],
+           f"current generation must give an empty delta: {d}")
+
+
+@check
+async def check_since_delta(h: Host) -> None:
+    gen = (await list_since(h, "0"))["gen"]
+    await h.get("/api/write/delta.txt?sync=1", "POST", b"hello")
+    d = await list_since(h, gen)
+    expect(not d["full"] and [e["name"] for e in d["changed"]] == ["delta.txt"],
+           f"write not in the delta: {d}")
+    await h.get("/api/delete/delta.txt", "POST")
+    d = await list_since(h, d["gen"])
+    expect(not d["full"] and d["removed"] == ["delta.txt"], f"delete not in the delta: {d}")
+
+
+@check
+async def check_list_after_queued_write(h: Host) -> None:
+    c = h.conn()                            # one connection: the list follows the write at once
+    try:
+        for size in (20000, 300):
+            await c.request("POST", "/api/write/queued.bin", b"q" * size)
+            status, _, data = await c.request("GET", "/api/list")
+            sizes = {e["name"]: e["size"] for e in json.loads(data)}
+            expect(sizes.get("queued.bin") == size, f"/api/list after a {size} B write: {sizes.get('queued.bin')}")
+    finally:
+        c.close()
+
+
+@check
+async def check_since_other_boot(h: Host) -> None:
+    gen = (await list_since(h, "0"))["gen"]
+    boot, _, n = gen.rpartition(".")
+    d = await list_since(h, f"{boot}.{int(n) + 50}")
+    expect(d["full"], f"generation ahead of the server must be full: {d}")
+    h.restart()
+    d = await list_since(h, gen)
+    expect(d["full"], f"token from the previous boot must be full: {d}")
+
+
+# ---- config.json ----
+@check
+async def check_config_save(h: Host) -> None:
+    path = os.path.join(h.root, "config.json")
+    status, _, _ = await h.get("/api/mode/ap", "POST")
+    with open(path) as f:                   # complete as soon as the reply is out
+        expect(status == 200 and json.load(f)["mode"] == "AP", "config.json after /api/mode/ap")
+    with open(path) as f:
+        saved = f.read()
+    with open(path, "w") as f:              # what a reset during the old save left
+        f.write("")
+    try:
+        h.srv.stop()
+        h.srv = Server(h.root)
+        status, _, _ = await h.get("/api/list")
+        expect(status == 200, f"boot with an empty config.json → {status}")
+    finally:
+        with open(path, "w") as f:
+            f.write(saved)
+        h.restart()
+
+
+# ---- Feature modules ----
+@check
+async def check_disabled_module(h: Host) -> None:
+    h.restart(DISABLED_MODULES=["pwd_wifi"])
+    try:
+        for method, path in (("POST", "/api/connect"), ("GET", "/api/scan"), ("POST", "/api/mode/ap")):
+            status, _, _ = await h.get(path, method, b"{}")
+            expect(status == 404, f"{method} {path} with pwd_wifi disabled → {status}")
+    finally:
+        h.restart(DISABLED_MODULES=[])
+
+
+@check
+async def check_moved_code(h: Host) -> None:
+    """Write path, bundle and stats live in pwd_* modules and still work after an unload."""
+    status, _, _ = await h.get("/api/write/pwd_write.py", "POST", b"x")
+    expect(status == 403, f"POST /api/write/pwd_write.py → {status}")
+    await h.get("/api/stats?reset")
+    await h.get("/api/list")
+    status, _, data = await h.get("/api/stats")
+    expect(json.loads(data)["routes"].get("/api/list", {}).get("count") == 1, f"stats: {data[:200]}")
+    for mod in ("pwd_files", "pwd_info"):
+        status, _, _ = await h.get(f"/api/modules?unload={mod}", "POST")
+        expect(status == 200, f"unload {mod} → {status}")
+    status, _, _ = await h.get("/api/write/moved.txt", "POST", b"after unload")
+    expect(status == 200, f"write after unloading pwd_files → {status}")
+    status, _, data = await h.get("/api/read/moved.txt")
+    expect(data == b"after unload", f"read back: {data!r}")
+    status, _, data = await h.get("/api/stats")
+    expect("/api/list" not in json.loads(data)["routes"], "stats survived an unload of pwd_info")
+
+
+APP_MODULE = """
+def setup(server):
+    async def app(req, rest):
+        await server.send(req, "app:" + rest)
+
+    async def sub(req, rest):
+        await server.send(req, "sub:" + rest)
+    server.route("/myapp/", prefix=True)(app)
+    server.route("/myapp/deep/er/", prefix=True)(sub)
+"""
+
+
+@check
+async def check_prefix_routes(h: Host) -> None:
+    with open(os.path.join(h.root, "check_app.py"), "w") as f:
+        f.write(APP_MODULE)
+    h.restart(API_MODULES=["check_app"])
+    try:
+        for path, want in (("/myapp/foo", b"app:foo"), ("/myapp/deep/x", b"app:deep/x"),
+                           ("/myapp/deep/er/y", b"sub:y"), ("/api/read/index.html", None)):
+            status, _, data = await h.get(path)
+            if want is None:
+                expect(status == 403, f"{path} → {status}")
+            else:
+                expect(status == 200 and data == want, f"{path} → {status} {data!r}")
+    finally:
+        h.restart(API_MODULES=[])
+        os.remove(os.path.join(h.root, "check_app.py"))
+
+
+# ---- /api/bundle caching ----
+async def bundle_gz(h: Host) -> dict:
+    """The bundle once bundle.json.gz exists (it is rebuilt BUNDLE_REBUILD_MS after a change)."""
+    for _ in range(100):
+        status, hd, data = await h.get("/api/bundle", headers="Accept-Encoding: gzip\r\n")
+        if hd.get("content-encoding") == "gzip":
+            return json.loads(gzip.decompress(data))
+        await asyncio.sleep(0.2)
+    raise AssertionError("bundle.json.gz was not rebuilt")
+
+
+@check
+async def check_bundle_cache(h: Host) -> None:
+    gz = "Accept-Encoding: gzip\r\n"
+    await bundle_gz(h)                      # built at boot: the ETag below stays put
+    status, hd, _ = await h.get("/api/bundle", headers=gz)
+    etag = hd.get("etag")
+    expect(status == 200 and "max-age" in hd.get("cache-control", ""), f"bundle headers: {hd}")
+    await h.get("/api/write/notes.txt?sync=1", "POST", b"not an app")
+    status, _, _ = await h.get("/api/bundle", headers=gz + f"If-None-Match: {etag}\r\n")
+    expect(status == 304, f"a .txt write must keep the bundle ETag: {status}")
+    await h.get("/api/write/Check.html?sync=1", "POST", b"<html></html>")
+    status, hd, live = await h.get("/api/bundle", headers=gz + f"If-None-Match: {etag}\r\n")
+    expect(status == 200 and hd.get("etag") != etag, f"a new app must change the ETag: {status}")
+    expect(await bundle_gz(h) == json.loads(live), "rebuilt bundle differs from the live one")
+
+
+@check
+async def check_bundle_offline_app(h: Host) -> None:
+    await bundle_gz(h)
+    with open(os.path.join(h.root, "Offline.html"), "w") as f:   # as mpremote would, server down
+        f.write("<html>copied</html>")
+    h.restart()
+    try:
+        status, hd, data = await h.get("/api/bundle", headers="Accept-Encoding: gzip\r\n")
+        d = json.loads(gzip.decompress(data) if hd.get("content-encoding") == "gzip" else data)
+        expect(any(e["name"] == "Offline.html" for e in d["files"]), f"stale bundle after boot: {d['files']}")
+        d = await bundle_gz(h)
+        expect(any(e["name"] == "Offline.html" for e in d["files"]), f"rebuilt bundle: {d['files']}")
+    finally:
+        await h.get("/api/delete/Offline.html", "POST")
+
+
+@check
+async def check_bundle_restricted(h: Host) -> None:
+    for name in ("bundle.json.gz", "bundle.json.gz.tmp"):
+        status, _, _ = await h.get(f"/api/write/{name}", "POST", b"not gzip")
+        expect(status == 403, f"POST /api/write/{name} → {status}")
+    await bundle_gz(h)                      # still the real one
+
+
+# ---- /api/upload ----
+@check
+async def check_upload_resend(h: Host) -> None:
+    path = os.path.join(h.root, "up.bin")
+    for token, order in (("t1", (0, 4)), ("t2", (4, 0))):
+        for off in order:
+            data = b"AAAA" if off == 0 else b"BBBB"
+            status, _, _ = await h.get(f"/api/upload/up.bin?offset={off}&token={token}&size=8&sync=1",
+                                       "POST", data)
+            expect(status == 200, f"chunk {off} of {token} → {status}")
+        await h.get(f"/api/upload/up.bin?offset=4&token={token}&size=8", "POST", b"BBBB")
+        await asyncio.sleep(0.3)            # a wrongly queued resend would reach flash
+        with open(path, "rb") as f:
+            got = f.read()
+        expect(got == b"AAAABBBB", f"{token} after a resent chunk: {got!r}")
+        status, _, data = await h.get(f"/api/upload/status?name=up.bin&token={token}")
+        expect(status == 200 and json.loads(data)["received"] == [[0, 8]],
+               f"status of finished {token}: {status} {data!r}")
+    await h.get("/api/upload/up.bin?offset=4&token=t3&size=6&sync=1", "POST", b"CC")
+    await h.get("/api/upload/up.bin?offset=0&token=t3&size=6&sync=1", "POST", b"DDDD")
+    with open(path, "rb") as f:
+        got = f.read()
+    expect(got == b"DDDDCC", f"shorter upload over a longer file: {got!r}")
+
+
+# ---- /api/chat ----
+@check
+async def check_chat_stream_limit(h: Host) -> None:
+    streams = []
+    try:
+        for _ in range(2):                  # CHAT_MAX_WAITERS
+            r, w = await asyncio.open_connection("127.0.0.1", h.srv.port)
+            w.write(b"GET /api/chat/stream HTTP/1.1\r\n\r\n")
+            expect((await r.readline()).startswith(b"HTTP/1.1 200 "), "stream refused below the limit")
+            streams.append((r, w))
+        await asyncio.sleep(0.2)            # both parked
+        status, hd, _ = await h.get("/api/chat/stream")
+        expect(status == 503 and "retry-after" in hd, f"stream over the limit → {status} {hd}")
+        t0 = asyncio.get_running_loop().time()
+        status, _, data = await h.get("/api/chat/poll?after=0&wait=5000")
+        expect(status == 200 and asyncio.get_running_loop().time() - t0 < 2,
+               f"poll over the limit must not park: {status} {data!r}")
+        await h.get("/api/chat/send", "POST", b'{"name":"a","message":"still here"}')
+        for r, _ in streams:                # neither parked stream was released
+            data = b""
+            while b"still here" not in data:
+                part = await asyncio.wait_for(r.read(4096), 3)
+                expect(part, f"a parked stream was closed: {data!r}")
+                data += part
+    finally:
+        for _, w in streams:
+            w.close()
+
+
+# ---- Request parsing and error statuses ----
+@check
+async def check_static_head(h: Host) -> None:
+    c = h.conn()
+    try:
+        status, get, body = await c.request("GET", "/index.html")
+        status, head, none = await c.request("HEAD", "/index.html")
+        expect(status == 200 and none == b"", f"HEAD /index.html → {status}, {len(none)} body bytes")
+        expect(head["content-length"] == str(len(body)) and head["etag"] == get["etag"],
+               f"HEAD headers differ from GET: {head}")
+        status, _, data = await c.request("GET", "/index.html")     # same connection, still framed
+        expect(status == 200 and data == body, "request after HEAD misframed")
+    finally:
+        c.close()
+
+
+@check
+async def check_ranges(h: Host) -> None:
+    data = b"0123456789" * 100
+    await h.get("/api/write/range.txt?sync=1", "POST", data)
+    c = h.conn()
+    try:
+        for path in ("/range.txt", "/api/download/range.txt"):
+            status, hd, _ = await c.request("GET", path)
+            etag = hd["etag"]
+            expect(status == 200 and hd.get("accept-ranges") == "bytes", f"{path} without Range: {status} {hd}")
+            for rng, first, last in (("10-19", 10, 19), ("-5", 995, 999), ("990-", 990, 999),
+                                     ("995-5000", 995, 999)):
+                status, hd, body = await c.request("GET", path, headers=f"Range: bytes={rng}\r\n")
+                expect(status == 206 and body == data[first:last + 1]
+                       and hd.get("content-range") == f"bytes {first}-{last}/1000",
+                       f"{path} bytes={rng} → {status} {hd.get('content-range')} {body[:20]!r}")
+            status, _, body = await c.request("GET", path, headers=f"Range: bytes=0-3\r\nIf-Range: {etag}\r\n")
+            expect(status == 206 and body == b"0123", f"{path} matching If-Range → {status}")
+            status, _, body = await c.request("GET", path, headers='Range: bytes=0-3\r\nIf-Range: "old"\r\n')
+            expect(status == 200 and body == data, f"{path} stale If-Range → {status}, {len(body)} B")
+            status, _, body = await c.request("GET", path, headers="Range: bytes=0-1,5-6\r\n")
+            expect(status == 200 and body == data, f"{path} several ranges → {status}")
+            status, hd, body = await c.request("GET", path, headers="Range: bytes=1000-\r\n")
+            expect(status == 416 and hd.get("content-range") == "bytes */1000" and body == b"",
+                   f"{path} past the end → {status} {hd}")
+    finally:
+        c.close()
+        await h.get("/api/delete/range.txt", "POST")
+
+
+@check
+async def check_malformed_request(h: Host) -> None:
+    for data in (b"GARBAGE\r\n\r\n", b"GET / HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+                 b"GET / HTTP/1.1\r\nContent-Length: -4\r\n\r\n",
+                 b"GET /\xff HTTP/1.1\r\n\r\n", b"GET / HTTP/1.1\r\nX-A: \xc3\x28\r\n\r\n"):
+        out = h.raw(data)
+        expect(out.startswith(b"HTTP/1.1 400 "), f"{data!r} → {out[:40]!r}")
+
+
+@check
+async def check_bad_numbers(h: Host) -> None:
+    for path in ("/api/list?since=x", "/api/list?since=ab.cd", "/api/log?after=x",
+                 "/api/chat/poll?after=x"):
+        status, _, _ = await h.get(path)
+        expect(status == 400, f"{path} → {status}")
+    for query in ("offset=x", "offset=-5", "size=-1"):
+        status, _, _ = await h.get(f"/api/upload/n.bin?{query}", "POST", b"x")
+        expect(status == 400, f"upload ?{query} → {status}")
+    expect(not os.path.exists(os.path.join(h.root, "n.bin")), "refused upload created n.bin")
+
+
+@check
+async def check_connect_missing_field(h: Host) -> None:
+    for body, field in ((b'{"psk": "x"}', b"ssid"), (b'{"ssid": "x"}', b"psk"), (b'[]', b"ssid, psk")):
+        status, _, data = await h.get("/api/connect", "POST", body)
+        expect(status == 400 and data == field, f"/api/connect {body!r} → {status} {data!r}")
+
+
+@check
+async def check_rename_copy_error(h: Host) -> None:
+    await h.get("/api/write/src.txt?sync=1", "POST", b"data")
+    os.mkdir(os.path.join(h.root, "adir"))
+    os.mkdir(os.path.join(h.root, "adir", "sub"))   # a non-empty directory can't be replaced
+    c = h.conn()
+    try:
+        for op in ("rename", "copy"):
+            status, hd, _ = await c.request("POST", f"/api/{op}/src.txt?to=adir")
+            expect(status == 500 and hd.get("connection") != "close", f"{op} onto a directory → {status} {hd}")
+        status, _, data = await c.request("GET", "/api/read/src.txt")   # same connection still usable
+        expect(status == 200 and data == b"data", f"request after a failed rename: {status}")
+    finally:
+        c.close()
+        shutil.rmtree(os.path.join(h.root, "adir"))
+
+
+@check
+async def check_patch(h: Host) -> None:
+    path = os.path.join(h.root, "patch.txt")
+
+    def content() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    status, hd, _ = await h.get("/api/write/patch.txt?sync=1", "POST", b"0123456789")
+    etag = hd.get("etag")
+    c = h.conn()
+    try:
+        for query, body, want in (("offset=2", b"ab", b"01ab456789"), ("append", b"XY", b"01ab456789XY"),
+                                  ("offset=10", b"Z", b"01ab456789ZY"),
+                                  ("offset=0&truncate=4", b"--", b"--ab"), ("truncate=3", b"", b"--a"),
+                                  ("offset=3", b"end", b"--aend")):
+            status, hd, _ = await c.request("POST", f"/api/patch/patch.txt?{query}&sync=1", body)
+            expect(status == 200 and content() == want, f"patch ?{query} → {status} {content()!r}")
+        status, _, _ = await c.request("POST", "/api/patch/patch.txt?offset=0&sync=1", b"x",
+                                       f"If-Match: {etag}\r\n")
+        expect(status == 412 and content() == b"--aend", f"patch with an old If-Match → {status}")
+        status, hd, _ = await c.request("GET", "/api/read/patch.txt")
+        status, _, _ = await c.request("POST", "/api/patch/patch.txt?offset=0&sync=1", b"+",
+                                       f"If-Match: {hd['etag']}\r\n")
+        expect(status == 200 and content() == b"+-aend", f"patch with the current If-Match → {status}")
+        for query, want in (("offset=7", 416), ("offset=-1", 416), ("truncate=-1", 416),
+                            ("", 400), ("offset=x", 400)):
+            status, _, _ = await c.request("POST", f"/api/patch/patch.txt?{query}", b"?")
+            expect(status == want and content() == b"+-aend", f"patch ?{query} → {status}, want {want}")
+        status, _, _ = await c.request("POST", "/api/patch/missing.txt?offset=0", b"x")
+        expect(status == 404, f"patch of a missing file → {status}")
+    finally:
+        c.close()
+        await h.get("/api/delete/patch.txt", "POST")
+
+
+@check
+async def check_batch_bad_op(h: Host) -> None:
+    ops = [{"op": "write", "name": "b1.txt", "data": "one"}, "x", {"op": "write", "name": "b2.txt", "data": 5},
+           {"op": "delete", "name": 7}, {"op": "write", "name": "b3.txt", "data": "three"}]
+    status, _, data = await h.get("/api/batch", "POST", json.dumps({"ops": ops}).encode())
+    expect(status == 200, f"batch with malformed ops → {status} {data!r}")
+    codes = [r["status"] for r in json.loads(data)["results"]]
+    expect(codes == [200, 400, 400, 400, 200], f"batch results: {codes}")
+    for name in ("b1.txt", "b3.txt"):
+        await h.get(f"/api/delete/{name}", "POST")
+
+
+@check
+async def check_read_large(h: Host) -> None:
+    data = bytes(range(256)) * 200          # several CHUNK blocks and a short tail
+    await h.get("/api/write/large.bin?sync=1", "POST", data)
+    c = h.conn()
+    try:
+        status, hd, got = await c.request("GET", "/api/read/large.bin")
+        expect(status == 200 and got == data, f"/api/read of {len(data)} B: {status}, {len(got)} B")
+        status, _, got = await c.request("GET", "/api/read/large.bin")   # framing kept
+        expect(status == 200 and got == data, f"second /api/read on the connection: {status}")
+    finally:
+        c.close()
+        await h.get("/api/delete/large.bin", "POST")
+
+
+@check
+async def check_body_too_large(h: Host) -> None:
+    for path in ("/api/chat/send", "/api/batch"):
+        status, _, _ = await h.get(path, "POST", b"x" * 10000)
+        expect(status == 413, f"{path} with 10 KB → {status}")
+
+
+@check
+async def check_restricted_gz(h: Host) -> None:
+    await h.get("/api/write/plain.txt?sync=1", "POST", b"x")
+    for method, path in (("POST", "/api/write/index.html.gz"), ("POST", "/api/patch/index.html.gz?append"),
+                         ("POST", "/api/upload/main.py.gz?size=1"), ("POST", "/api/rename/plain.txt?to=index.html.gz"),
+                         ("POST", "/api/copy/plain.txt?to=config.json.gz"), ("GET", "/api/read/index.html.gz")):
+        status, _, _ = await h.get(path, method, b"x")
+        expect(status == 403, f"{method} {path} → {status}")
+    expect(not os.path.exists(os.path.join(h.root, "index.html.gz")), "index.html.gz was written")
+
+
+@check
+async def check_dot_names(h: Host) -> None:
+    await h.get("/api/write/dot.txt?sync=1", "POST", b"x")
+    for path, want in (("/api/write/./pwd_chat.py", 403), ("/api/write/././main.py", 403),
+                       ("/api/write/../x.txt", 400), ("/api/write//x.txt", 400),
+                       ("/api/copy/dot.txt?to=./notes.txt", 200), ("/api/rename/notes.txt?to=./main.py", 403)):
+        status, _, _ = await h.get(path, "POST", b"x")
+        expect(status == want, f"POST {path} → {status}, want {want}")
+    ops = [{"op": "write", "name": "./config.json", "data": "{}"}, {"op": "delete", "name": "../x"}]
+    status, _, data = await h.get("/api/batch", "POST", json.dumps({"ops": ops}).encode())
+    codes = [r["status"] for r in json.loads(data)["results"]]
+    expect(codes == [403, 400], f"batch with dotted names: {codes}")
+    expect(os.path.exists(os.path.join(h.root, "notes.txt")), "copy to ./notes.txt missing")
+    for name in ("dot.txt", "notes.txt"):
+        await h.get(f"/api/delete/{name}", "POST")
+
+
+# ---- Connection slots ----
+@check
+async def check_stalled_readers(h: Host) -> None:
+    h.restart(WRITE_TIMEOUT_MS=1000)
+    stalled = []
+    try:
+        await h.get("/api/write/big.bin?sync=1", "POST", b"s" * (8 << 20))
+        for _ in range(4):                  # MAX_CONN downloads nobody reads
+            s = socket.socket()
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            s.connect(("127.0.0.1", h.srv.port))
+            s.sendall(b"GET /api/download/big.bin HTTP/1.1\r\n\r\n")
+            stalled.append(s)
+        for _ in range(20):                 # socket buffers fill first, then WRITE_TIMEOUT_MS
+            await asyncio.sleep(0.5)
+            status, _, _ = await h.get("/index.html")
+            if status == 200:
+                break
+        expect(status == 200, f"request after stalled readers timed out → {status}")
+    finally:
+        for s in stalled:
+            s.close()
+        await h.get("/api/delete/big.bin", "POST")
+        h.restart(WRITE_TIMEOUT_MS=5000)
+
+
+async def run(names) -> int:
+    failed = 0
+    h = Host()
+    try:
+        for name, fn in CHECKS:
+            if names and name not in names:
+                continue
+            try:
+                await asyncio.wait_for(fn(h), 30)
+                print(f"ok    {name}")
+            except Exception as e:
+                failed += 1
+                print(f"FAIL  {name}: {e!r}")
+    finally:
+        h.close()
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run(sys.argv[1:])) else 0)
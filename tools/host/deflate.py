@@ -0,0 +1,65 @@
+# ----------------------------------------------------------
+#  PicoWDesk – host stand-in for MicroPython's `deflate`
+#  DeflateIO on top of zlib: inflate when read, compress when
+#  written. Only the pieces main.py touches are modelled.
+# ----------------------------------------------------------
+import zlib
+
+AUTO, RAW, ZLIB, GZIP = 0, 1, 2, 3
+_OFFSET = {ZLIB: 0, GZIP: 16, AUTO: 32}     # zlib's wbits offsets per container
+
+
+class DeflateIO:
+    """Stream wrapper: DeflateIO(stream, format=AUTO, wbits=0, close=False)."""
+
+    def __init__(self, stream, format: int = AUTO, wbits: int = 0, close: bool = False) -> None:
+        self.stream = stream
+        self.close_stream = close
+        bits = wbits or 15
+        self._bits = -bits if format == RAW else bits + _OFFSET[format]
+        self._d = self._c = None
+        self._pending = b""
+
+    # -- reading (decompression) --
+    def readinto(self, buf) -> int:
+        if self._d is None:
+            self._d = zlib.decompressobj(self._bits)
+        while not self._pending and not self._d.eof:
+            raw = self.stream.read(4096)
+            if not raw:
+                break
+            self._pending = self._d.decompress(raw)
+        n = min(len(buf), len(self._pending))
+        buf[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def read(self, n: int = -1) -> bytes:
+        out = bytearray()
+        chunk = bytearray(4096)
+        while n < 0 or len(out) < n:
+            got = self.readinto(memoryview(chunk)[:4096 if n < 0 else min(4096, n - len(out))])
+            if not got:
+                break
+            out += chunk[:got]
+        return bytes(out)
+
+    # -- writing (compression) --
+    def write(self, data) -> int:
+        if self._c is None:
+            self._c = zlib.compressobj(9, zlib.DEFLATED, self._bits)
+        self.stream.write(self._c.compress(bytes(data)))
+        return len(data)
+
+    def close(self) -> None:
+        if self._c is not None:
+            self.stream.write(self._c.flush())
+            self._c = None
+        if self.close_stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
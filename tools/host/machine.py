@@ -0,0 +1,45 @@
+# ----------------------------------------------------------
+#  PicoWDesk – host stand-in for MicroPython's `machine`
+#  Only the pieces main.py touches are modelled.
+# ----------------------------------------------------------
+
+
+class Pin:
+    """GPIO pin that just remembers its value."""
+    IN = 0
+    OUT = 1
+
+    def __init__(self, pin_id, mode: int = IN) -> None:
+        self.id = pin_id
+        self.mode = mode
+        self._value = 0
+
+    def on(self) -> None:
+        self._value = 1
+
+    def off(self) -> None:
+        self._value = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+
+class ADC:
+    """ADC returning a fixed reading (~27 °C on the temperature channel)."""
+    READING = 14020
+
+    def __init__(self, channel) -> None:
+        self.channel = channel
+
+    def read_u16(self) -> int:
+        return self.READING
+
+
+class ResetRequested(SystemExit):
+    """Raised instead of rebooting so the host process stops cleanly."""
+
+
+def reset() -> None:
+    raise ResetRequested("machine.reset()")
@@ -0,0 +1,63 @@
+# ----------------------------------------------------------
+#  PicoWDesk – host stand-in for MicroPython's `network`
+#  WLAN objects are per-interface singletons, like on the Pico.
+# ----------------------------------------------------------
+STA_IF = 0
+AP_IF = 1
+
+# (ssid, bssid, channel, rssi, security, hidden) – same shape as WLAN.scan()
+SCAN_RESULTS = [
+    (b"HostNet", b"\x00\x11\x22\x33\x44\x55", 6, -42, 3, 0),
+    (b"Neighbour", b"\x00\x11\x22\x33\x44\x66", 11, -71, 3, 0),
+    (b"", b"\x00\x11\x22\x33\x44\x77", 1, -80, 0, 1),
+]
+STA_CONNECTS = True             # set False to exercise the AP fall-back
+
+
+class WLAN:
+    _instances = {}
+
+    def __new__(cls, interface: int = STA_IF):
+        if interface not in cls._instances:
+            wlan = super().__new__(cls)
+            wlan.interface = interface
+            wlan._active = False
+            wlan._connected = False
+            wlan._config = {"ssid": "", "hostname": "picowdesk"}
+            cls._instances[interface] = wlan
+        return cls._instances[interface]
+
+    def active(self, state=None):
+        if state is None:
+            return self._active
+        self._active = bool(state)
+        if not self._active:
+            self._connected = False
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        if "essid" in kwargs:
+            kwargs["ssid"] = kwargs.pop("essid")
+        self._config.update(kwargs)
+
+    def connect(self, ssid: str, psk: str = "") -> None:
+        self._config["ssid"] = ssid
+        self._connected = self._active and STA_CONNECTS
+
+    def disconnect(self) -> None:
+        self._connected = False
+
+    def isconnected(self) -> bool:
+        return self._connected
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -50
+        return 3 if self._connected else 0
+
+    def ifconfig(self):
+        return ("127.0.0.1", "255.255.255.0", "127.0.0.1", "127.0.0.1")
+
+    def scan(self):
+        return list(SCAN_RESULTS)
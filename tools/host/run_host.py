@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# ----------------------------------------------------------
+#  PicoWDesk – run main.py unmodified on a Linux host
+#
+#  python3 tools/host/run_host.py [--root DIR] [--port 8080]
+#                                  [--peak-file PATH]
+#
+#  The stub `machine`, `network` and `uasyncio` modules next
+#  to this file are put first on sys.path, and the handful of
+#  MicroPython-only functions in `time`/`gc` and on sockets
+#  are patched in.
+#  --root is the directory served as the Pico filesystem
+#  (e.g. the `deploy` folder built by a package-*.sh script).
+#  With --peak-file, SIGUSR1 writes the peak heap since the
+#  previous SIGUSR1 to PATH (used by tools/bench_load.py).
+# ----------------------------------------------------------
+import argparse
+import asyncio
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(os.path.dirname(HERE))
+PICO_HEAP = 192 * 1024          # approx. heap after boot on a Pico W
+HOST_HEAP = 2048 * 1024         # CPython objects and socket buffers are several times
+                                # bigger; a Pico-sized figure would trip HEAP_LOW_WATER
+
+
+def patch_micropython_builtins(heap: int = PICO_HEAP) -> None:
+    """Add the MicroPython extensions of `time` and `gc` that main.py uses."""
+    t0 = time.monotonic()
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.ticks_ms = lambda: int((time.monotonic() - t0) * 1000)
+    time.ticks_us = lambda: int((time.monotonic() - t0) * 1000000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+
+    # Heap figures are the Python allocations made since the last
+    # rebase_heap(), measured with tracemalloc and mapped onto a
+    # Pico-sized heap.
+    tracemalloc.start()
+    rebase_heap()
+    gc.mem_alloc = lambda: max(0, tracemalloc.get_traced_memory()[0] - _heap_base[0])
+    gc.mem_free = lambda: max(0, heap - gc.mem_alloc())
+
+
+def patch_micropython_socket() -> None:
+    """Blocking sockets as stream objects (readline/read/write), as MicroPython's
+    are: the pre-uasyncio-streams server (baseline revision) reads requests
+    with cl.readline()."""
+    def readline(self) -> bytes:
+        line = bytearray()
+        while not line.endswith(b"\n"):
+            c = self.recv(1)
+            if not c:
+                break
+            line += c
+        return bytes(line)
+
+    def read(self, n: int = -1) -> bytes:
+        return self.recv(n) if n >= 0 else b"".join(iter(lambda: self.recv(4096), b""))
+
+    socket.socket.readline = readline
+    socket.socket.read = read
+    socket.socket.write = socket.socket.send
+
+
+_heap_base = [0]
+
+def rebase_heap() -> None:
+    """Count heap usage from now on (call once main.py is imported)."""
+    _heap_base[0] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+
+
+def report_peak_on_signal(path: str) -> None:
+    """SIGUSR1: write the peak heap since the last signal (bytes) to *path*."""
+    def handler(signum, frame):
+        with open(path, "w") as f:
+            f.write(str(max(0, tracemalloc.get_traced_memory()[1] - _heap_base[0])))
+        tracemalloc.reset_peak()
+    signal.signal(signal.SIGUSR1, handler)
+
+
+def load_main(root: str, port: int):
+    """Import main.py from *root* with *root* as the working directory."""
+    sys.path.insert(0, HERE)
+    os.chdir(root)
+    sys.path.insert(1, root)
+    import main
+    sys.modules["__main__"] = main      # as on the Pico, where main.py *is* __main__
+    main.PORT = port
+    rebase_heap()
+    return main
+
+
+def run() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--root", default=REPO, help="directory served as the Pico filesystem")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--heap", type=int, default=HOST_HEAP,
+                    help=f"simulated heap size in bytes (e.g. {PICO_HEAP} to provoke shedding)")
+    ap.add_argument("--peak-file", help="on SIGUSR1, write the peak heap since the last one here")
+    args = ap.parse_args()
+
+    patch_micropython_builtins(args.heap)
+    patch_micropython_socket()
+    if args.peak_file:
+        report_peak_on_signal(os.path.abspath(args.peak_file))
+    main = load_main(os.path.abspath(args.root), args.port)
+    try:
+        asyncio.run(main.main())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    run()
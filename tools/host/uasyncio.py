@@ -0,0 +1,24 @@
+# ----------------------------------------------------------
+#  PicoWDesk – host stand-in for MicroPython's `uasyncio`
+#  CPython's asyncio plus the MicroPython-only helpers.
+# ----------------------------------------------------------
+import asyncio as _asyncio
+from asyncio import *          # noqa: F401,F403
+
+
+async def sleep_ms(ms: int) -> None:
+    await _asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(aw, timeout_ms: int):
+    return await _asyncio.wait_for(aw, timeout_ms / 1000)
+
+
+async def _readinto(self, buf) -> int:
+    """MicroPython's Stream.readinto(), missing from CPython's StreamReader."""
+    data = await self.read(len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+
+StreamReader.readinto = _readinto      # noqa: F405